@@ -1,810 +1,1547 @@
-# app.py
-# AI Listing Writer – Local Streamlit app (no MLS; features inside a FORM so dropdowns don't close)
-# - Fixed model: gpt-4.1-mini
-# - Grouped feature selectors (no search bar)
-# - Auto-generates: Upgrades/Features bullets + SEO keywords from selections (+ optional extras)
-# - Robust JSON handling + self-repair for missing fields
-# - Character range enforcement for MLS description
-# Run: streamlit run app.py
-
-import json
-import os
-import re
-from dataclasses import dataclass
-from typing import List, Optional, Dict, Any, Tuple
-
-import streamlit as st
-from dotenv import load_dotenv
-from openai import OpenAI
-
-# ---------- Setup (cloud + local) ----------
-
-load_dotenv()  # lets local .env work
-
-# Read from Streamlit Secrets first (cloud), then .env (local)
-OPENAI_API_KEY = st.secrets.get("OPENAI_API_KEY") or os.getenv("OPENAI_API_KEY")
-APP_PASSWORD   = st.secrets.get("APP_PASSWORD")   or os.getenv("APP_PASSWORD")
-
-st.set_page_config(page_title="AI Listing Writer (Beta)", page_icon="🏠", layout="wide")
-
-if not OPENAI_API_KEY:
-    st.error("Missing OPENAI_API_KEY (set it in Streamlit → Settings → Secrets, or your local .env).")
-    st.stop()
-
-# ---- Tiny password gate (beta) ----
-def check_password():
-    # already authenticated?
-    if st.session_state.get("authed"):
-        with st.sidebar:
-            if st.button("Log out"):
-                st.session_state["authed"] = False
-                st.rerun()
-        return True
-
-    st.title("AI Listing Writer — Beta Access")
-    pw = st.text_input("Enter beta password", type="password")
-    if st.button("Enter"):
-        if APP_PASSWORD and pw == APP_PASSWORD:
-            st.session_state["authed"] = True
-            st.rerun()
-        else:
-            st.error("Incorrect password")
-    st.stop()
-
-# gate the app
-if not check_password():
-    st.stop()
-
-# OpenAI client
-client = OpenAI(api_key=OPENAI_API_KEY)
-
-# ---------- Model ----------
-MODEL_NAME = "gpt-4.1-mini"  # change to "gpt-4o-mini" if you prefer
-
-# ---------- Data model ----------
-@dataclass
-class ListingInput:
-    address: str
-    city: str
-    state: str
-    zip_code: str
-    beds: Optional[float]
-    baths: Optional[float]
-    sqft: Optional[int]
-    lot_size: Optional[int]
-    year_built: Optional[int]
-    property_type: str
-    price: Optional[int]
-    # Derived from selections:
-    keywords: List[str]
-    upgrades_bullets: str
-    # Free text:
-    neighborhood_notes: str
-    target_buyer_profile: str
-    tone: str
-    mls_char_limit: int
-    detail_level: str  # "Concise", "Standard", "Descriptive"
-    highlight_features: List[str]  # prioritized features to emphasize
-
-# ---------- Feature Taxonomy ----------
-def feature_taxonomy() -> Dict[str, List[Tuple[str, List[str]]]]:
-    return {
-        "Exterior & Lot": [
-            ("Corner lot", ["corner lot"]),
-            ("Cul-de-sac", ["cul-de-sac"]),
-            ("Large backyard", ["large backyard", "spacious yard", "big yard"]),
-            ("Usable yard", ["usable yard", "flat yard"]),
-            ("Drought-tolerant landscaping", ["drought tolerant", "low maintenance landscaping"]),
-            ("Mature trees", ["mature trees"]),
-            ("Fruit trees", ["fruit trees"]),
-            ("Garden beds", ["garden beds"]),
-            ("RV/Boat parking", ["rv parking", "boat parking"]),
-            ("Gated driveway", ["gated driveway"]),
-            ("Circular driveway", ["circular driveway"]),
-            ("Motor court", ["motor court"]),
-            ("Privacy fencing", ["privacy fencing"]),
-            ("Privacy hedges", ["privacy hedges"]),
-            # Garage sizes & details
-            ("1-car garage", ["1-car garage", "single car garage"]),
-            ("2-car garage", ["2-car garage", "two car garage"]),
-            ("3-car garage", ["3-car garage", "three car garage"]),
-            ("4-car garage", ["4-car garage", "four car garage"]),
-            ("5-car+ garage", ["5-car garage", "five car garage"]),
-            ("Tandem garage", ["tandem garage"]),
-            ("Detached garage", ["detached garage"]),
-            ("Workshop area", ["garage workshop", "workbench"]),
-            ("Built-in garage storage", ["garage storage", "built-in garage cabinets"]),
-            ("EV charger (Level 2)", ["ev charger", "240v outlet"]),
-        ],
-        "Outdoor Living": [
-            ("Covered patio", ["covered patio"]),
-            ("Pergola", ["pergola"]),
-            ("Gazebo", ["gazebo"]),
-            ("Retractable awning", ["retractable awning"]),
-            ("Deck (wood)", ["wood deck"]),
-            ("Deck (composite)", ["composite deck"]),
-            ("Rooftop deck", ["rooftop deck"]),
-            ("Wraparound porch", ["wraparound porch"]),
-            ("Balcony", ["balcony"]),
-            ("Built-in BBQ", ["built-in bbq"]),
-            ("Outdoor kitchen (sink/fridge)", ["outdoor kitchen", "outdoor sink", "outdoor fridge"]),
-            ("Bar seating", ["bar seating"]),
-            ("Fire pit", ["fire pit"]),
-            ("Outdoor fireplace", ["outdoor fireplace"]),
-            ("Water feature (fountain/pond/waterfall)", ["water feature", "fountain", "pond", "waterfall"]),
-            ("Putting green", ["putting green"]),
-            ("Sport court", ["sport court"]),
-            ("Pickleball", ["pickleball"]),
-            ("Play structure", ["play structure"]),
-            ("Dog run", ["dog run"]),
-            # Pool / spa / sauna
-            ("Pool (in-ground)", ["pool", "in-ground pool"]),
-            ("Pool (saltwater)", ["saltwater pool"]),
-            ("Pool (heated)", ["heated pool"]),
-            ("Lap pool", ["lap pool"]),
-            ("Spa/Hot tub", ["spa", "hot tub"]),
-            ("Sauna (dry)", ["dry sauna"]),
-            ("Sauna (infrared)", ["infrared sauna"]),
-        ],
-        "Views & Orientation": [
-            ("Ocean view", ["ocean view"]),
-            ("Bay view", ["bay view"]),
-            ("City lights view", ["city lights view"]),
-            ("Mountain view", ["mountain view"]),
-            ("Canyon/Greenbelt view", ["canyon view", "greenbelt view"]),
-            ("Golf course view", ["golf course view"]),
-            ("Park view", ["park view"]),
-            ("East-facing (morning light)", ["east-facing"]),
-            ("West-facing (sunsets)", ["west-facing"]),
-            ("South-facing yard", ["south-facing yard"]),
-            ("Picture windows", ["picture windows"]),
-            ("Bay window", ["bay window"]),
-        ],
-        "Property Type & Layout": [
-            ("Single-story (step-free)", ["single story", "single level", "step-free"]),
-            ("Two-story", ["two story"]),
-            ("Split-level", ["split level"]),
-            ("Open-concept", ["open concept", "open floor plan"]),
-            ("Great room", ["great room"]),
-            ("Vaulted ceilings", ["vaulted ceilings"]),
-            ("Double-height ceilings", ["double-height ceilings"]),
-            ("Skylights", ["skylights"]),
-            ("Formal dining", ["formal dining"]),
-            ("Den/Home office", ["den", "home office"]),
-            ("Loft", ["loft"]),
-            ("Media room/Home theater", ["media room", "home theater"]),
-            ("Game room", ["game room"]),
-            ("Gym", ["home gym"]),
-            ("Mudroom", ["mudroom"]),
-            ("ADU (permitted)", ["adu"]),
-            ("Guest house/Casita (permitted)", ["guest house", "casita"]),
-            ("Primary suite on main", ["primary on main"]),
-            ("Dual primary suites", ["dual primary"]),
-            ("Jack-and-Jill bath", ["jack and jill"]),
-            ("En-suite secondaries", ["en-suite bedrooms"]),
-            ("Built-ins", ["built-ins"]),
-            ("Window seats", ["window seats"]),
-            ("Wainscoting/Trim/Crown", ["wainscoting", "crown molding", "trim work"]),
-            ("Recessed lighting", ["recessed lighting"]),
-            ("Statement lighting", ["statement lighting"]),
-            ("Fireplace(s)", ["fireplace"]),
-        ],
-        "Kitchen": [
-            ("Newly updated kitchen", ["updated kitchen", "renovated kitchen"]),
-            ("Quartz countertops", ["quartz countertops"]),
-            ("Granite countertops", ["granite countertops"]),
-            ("Quartzite countertops", ["quartzite"]),
-            ("Marble countertops", ["marble"]),
-            ("Butcher block counters", ["butcher block"]),
-            ("Soft-close cabinets", ["soft close cabinets"]),
-            ("Walk-in pantry", ["walk-in pantry"]),
-            ("Glass uppers", ["glass uppers"]),
-            ("Custom millwork", ["custom cabinets"]),
-            ("Island with seating", ["kitchen island with seating"]),
-            ("Waterfall edge", ["waterfall island"]),
-            ("Prep sink", ["prep sink"]),
-            ("Stainless appliances", ["stainless steel appliances"]),
-            ("Panel-ready/built-in fridge", ["panel ready appliances", "built-in fridge"]),
-            ("Gas range", ["gas range"]),
-            ("Professional range (36\")", ["36-inch range", "professional range"]),
-            ("Professional range (48\")", ["48-inch range", "professional range"]),
-            ("Double oven", ["double oven"]),
-            ("Convection/steam oven", ["convection oven", "steam oven"]),
-            ("Pot filler", ["pot filler"]),
-            ("Vented hood", ["vented hood"]),
-            ("Farmhouse sink", ["farmhouse sink"]),
-            ("Touch faucet", ["touch faucet"]),
-            ("Water filtration/RO", ["water filtration", "reverse osmosis"]),
-            ("Beverage center/coffee bar", ["beverage center", "coffee bar"]),
-            ("Wine fridge", ["wine fridge"]),
-            ("Microwave drawer", ["microwave drawer"]),
-            ("Designer backsplash", ["designer backsplash"]),
-        ],
-        "Bathrooms": [
-            ("Double vanity", ["double vanity"]),
-            ("Soaking tub", ["soaking tub"]),
-            ("Separate shower", ["separate shower"]),
-            ("Walk-in/curbless shower", ["walk-in shower", "curbless shower"]),
-            ("Rain shower", ["rain shower"]),
-            ("Body sprays", ["body sprays"]),
-            ("Frameless glass", ["frameless glass"]),
-            ("Heated floors", ["heated floors"]),
-            ("Towel warmer", ["towel warmer"]),
-            ("Bidet/bidet seat", ["bidet", "bidet seat"]),
-            ("Smart mirror", ["smart mirror", "backlit mirror"]),
-            ("Smart lighting (bath)", ["smart bath lighting"]),
-            ("Linen closet", ["linen closet"]),
-            ("Updated powder room", ["updated powder room"]),
-            ("Skylight in bath", ["bath skylight"]),
-        ],
-        "Bedrooms & Storage": [
-            ("Primary walk-in closet", ["walk-in closet"]),
-            ("Custom closet system", ["custom closets"]),
-            ("Primary balcony", ["primary balcony"]),
-            ("Primary retreat/sitting area", ["primary retreat"]),
-            ("Fireplace in primary", ["primary fireplace"]),
-            ("Large secondary bedrooms", ["large secondary bedrooms"]),
-            ("Guest suite", ["guest suite"]),
-            ("Nursery", ["nursery"]),
-            ("Coat closet", ["coat closet"]),
-            ("Linen storage", ["linen storage"]),
-            ("Attic storage", ["attic storage"]),
-            ("Shed/Outbuilding", ["storage shed", "outbuilding"]),
-            ("Overhead garage racks", ["garage racks"]),
-        ],
-        "Laundry & Utility": [
-            ("Inside laundry room", ["laundry room"]),
-            ("Garage laundry", ["garage laundry"]),
-            ("Closet laundry", ["closet laundry"]),
-            ("Laundry sink", ["laundry sink"]),
-            ("Folding counter", ["folding counter"]),
-            ("Laundry cabinetry", ["laundry cabinets"]),
-            ("Hanging rack", ["hanging rack"]),
-            ("Gas hookups", ["gas hookups"]),
-            ("Electric hookups (220V)", ["electric hookups", "220v laundry"]),
-        ],
-        "Flooring & Surfaces": [
-            ("Hardwood/Wood floors", ["hardwood floors", "wood floors"]),
-            ("Luxury vinyl plank (LVP)", ["lvp flooring"]),
-            ("Tile (porcelain/ceramic)", ["tile floors"]),
-            ("Stone (travertine/marble/slate)", ["stone floors", "travertine", "marble", "slate"]),
-            ("Polished concrete", ["polished concrete"]),
-            ("New carpet", ["new carpet"]),
-            ("Hypoallergenic flooring", ["hypoallergenic flooring"]),
-        ],
-        "Systems, Energy & Smart Home": [
-            ("Solar (owned)", ["owned solar"]),
-            ("Solar (leased)", ["leased solar"]),
-            ("Battery backup", ["battery backup"]),
-            ("Generator transfer switch", ["generator transfer switch"]),
-            ("Dual-pane windows", ["dual pane windows"]),
-            ("Energy-efficient glazing", ["energy efficient windows"]),
-            ("Upgraded insulation (attic/crawl)", ["attic insulation", "crawlspace insulation"]),
-            ("Tankless water heater", ["tankless water heater"]),
-            ("Newer HVAC", ["newer hvac"]),
-            ("Multi-zone HVAC", ["multi-zone hvac"]),
-            ("Whole-house fan", ["whole house fan"]),
-            ("Smart thermostat", ["smart thermostat"]),
-            ("Video doorbell", ["video doorbell"]),
-            ("Security cameras", ["security cameras"]),
-            ("Smart locks", ["smart locks"]),
-            ("Smart lighting", ["smart lighting"]),
-            ("Wired Ethernet (CAT6)", ["cat6 wiring", "ethernet wiring"]),
-            ("Speaker pre-wire", ["speaker prewire"]),
-            ("Security system", ["security system"]),
-            ("Interior fire sprinklers", ["fire sprinklers"]),
-            ("Smart smoke detectors", ["smart smoke detectors"]),
-            ("Smart CO detectors", ["smart co detectors"]),
-            ("Fresh-air system/ERV", ["erv", "fresh air system"]),
-            ("Air purifier", ["air purifier"]),
-            ("Low-VOC finishes", ["low voc finishes"]),
-        ],
-        "Community & HOA": [
-            ("Gated community", ["gated community"]),
-            ("Guard-gated community", ["guard gated"]),
-            ("Community pool", ["community pool"]),
-            ("Community spa", ["community spa"]),
-            ("Clubhouse", ["clubhouse"]),
-            ("Gym/Fitness center", ["fitness center"]),
-            ("Pickleball courts", ["pickleball"]),
-            ("Tennis courts", ["tennis courts"]),
-            ("Playground", ["playground"]),
-            ("Dog park", ["dog park"]),
-            ("Walking trails", ["walking trails"]),
-            ("Community garden", ["community garden"]),
-            ("Package lockers", ["package lockers"]),
-            ("Community RV lot", ["community rv lot"]),
-        ],
-        "Location & Access": [
-            ("Near parks", ["near parks"]),
-            ("Near trails", ["near trails"]),
-            ("Near shopping", ["near shopping"]),
-            ("Near dining", ["near dining"]),
-            ("Near hospitals/medical", ["near hospitals", "near medical"]),
-            ("Easy freeway access", ["easy freeway access"]),
-            ("Near I-5", ["near i-5"]),
-            ("Near I-15", ["near i-15"]),
-            ("Near local schools (proximity)", ["near local schools"]),
-            ("Transit nearby", ["near transit"]),
-        ],
-        "Specialty / Market Segments": [
-            ("Accessibility: zero-step entry", ["zero step entry", "step-free"]),
-            ("Accessibility: wide halls/doors", ["wide hallways", "wide doors"]),
-            ("Roll-in/curbless shower", ["roll-in shower", "curbless shower"]),
-            ("New construction/recent build", ["new construction", "recent build"]),
-            ("Craftsman style", ["craftsman"]),
-            ("Spanish/Mediterranean style", ["spanish", "mediterranean"]),
-            ("Mid-Century style", ["mid-century"]),
-            ("Modern/Contemporary", ["modern", "contemporary"]),
-            ("Farmhouse/Tudor", ["farmhouse", "tudor"]),
-            ("Income/ADU/lock-off", ["adu potential", "separate entrance", "lock off"]),
-            ("Well", ["well"]),
-            ("Septic (updated)", ["septic updated"]),
-            ("Workshop/Barn/Studio", ["workshop", "barn", "artist studio"]),
-        ],
-    }
-
-HEADLINE_DEFAULTS = [
-    "Pool (in-ground)", "Spa/Hot tub", "Ocean view", "Mountain view",
-    "Large backyard", "Open-concept", "ADU (permitted)", "Guest house/Casita (permitted)",
-    "Solar (owned)", "Single-story (step-free)", "2-car garage", "3-car garage", "4-car garage"
-]
-
-# ---------- Keyword & Upgrades builders ----------
-def build_keywords_from_selections(
-    selected: Dict[str, List[str]],
-    beds: Optional[float],
-    baths: Optional[float],
-    sqft: Optional[int],
-    lot_size: Optional[int],
-    year_built: Optional[int],
-    property_type: str,
-    extra_keywords: List[str]
-) -> List[str]:
-    tax = feature_taxonomy()
-    tokens: List[str] = []
-    label_to_variants: Dict[str, List[str]] = {
-        label: variants for group, items in tax.items() for (label, variants) in items
-    }
-
-    for group, labels in selected.items():
-        for label in labels:
-            variants = label_to_variants.get(label, [])
-            if variants:
-                tokens.extend(variants)
-            else:
-                tokens.append(label)
-
-    if beds:
-        tokens.append(f"{int(beds)} bedrooms")
-    if baths is not None:
-        tokens.append(f"{baths} bathrooms")
-    if sqft:
-        tokens.append(f"{int(sqft)} sqft")
-    if lot_size:
-        tokens.append(f"{int(lot_size)} sf lot")
-    if year_built:
-        tokens.append(f"built {int(year_built)}")
-    if property_type:
-        tokens.append(property_type.lower())
-
-    tokens.extend([k.strip() for k in extra_keywords if k.strip()])
-
-    cleaned: List[str] = []
-    seen = set()
-    for t in tokens:
-        t2 = " ".join(str(t).split()).strip(",; ").lower()
-        if t2 and t2 not in seen:
-            seen.add(t2)
-            cleaned.append(t2)
-
-    return cleaned[:60]
-
-def build_upgrades_bullets(selected: Dict[str, List[str]], custom_lines: List[str]) -> str:
-    lines: List[str] = []
-    for group, labels in selected.items():
-        if not labels:
-            continue
-        line = f"- {group}: " + ", ".join(labels)
-        lines.append(line)
-    for raw in custom_lines:
-        val = " ".join(raw.split()).strip()
-        if val:
-            lines.append(f"- {val}")
-    return "\n".join(lines[:30])
-
-# ---------- Prompt + Model flow ----------
-REQUIRED_KEYS = ["mls_description", "social_caption", "instagram_hashtags", "video_script_60s"]
-
-def detail_level_guidance(level: str) -> str:
-    if level == "Concise":
-        return "Aim for the LOWER end of the allowed range. Use concise, information-dense sentences."
-    if level == "Descriptive":
-        return "Aim for the UPPER end of the allowed range. Add factual details drawn from inputs."
-    return "Aim for the MIDDLE of the allowed range with balanced clarity."
-
-def build_primary_prompt(li: ListingInput) -> str:
-    min_chars = int(li.mls_char_limit * 0.9)
-    guidance = detail_level_guidance(li.detail_level)
-    headline = ", ".join(li.highlight_features[:6]) if li.highlight_features else ""
-    kw_text = ", ".join(li.keywords)
-
-    return f"""
-You are an expert real estate copywriter for MLS, Zillow/Redfin, and social media.
-Write compelling, accurate, compliant copy. Avoid fair-housing issues and prohibited wording.
-
-Return ONLY valid JSON with these keys:
-- "mls_description": string (between {min_chars} and {li.mls_char_limit} characters, no emojis)
-- "social_caption": string (1–2 sentences, approachable, no hashtags)
-- "instagram_hashtags": string (10–18 space-separated hashtags, no commas)
-- "video_script_60s": string (a 45–60 second walkthrough script; short sentences; easy to read aloud)
-
-Context:
-- Address: {li.address}, {li.city}, {li.state} {li.zip_code}
-- Property Type: {li.property_type}
-- Beds/Baths: {li.beds} bd / {li.baths} ba
-- Interior Sq Ft: {li.sqft}
-- Lot Size: {li.lot_size}
-- Year Built: {li.year_built}
-- Price: {li.price}
-- SEO Keywords to weave in: {kw_text}
-- Upgrades/Features (bulleted): 
-{li.upgrades_bullets}
-- Neighborhood notes (neutral proximity phrasing): {li.neighborhood_notes}
-- Highlight features to emphasize early: {headline if headline else "None"}
-- Target buyer profile: {li.target_buyer_profile}
-- Tone: {li.tone}
-
-Rules:
-- MLS description MUST be between {min_chars} and {li.mls_char_limit} chars.
-- {guidance}
-- The first sentence must be a strong hook that highlights the single most impressive or unique feature in under 12 words. 
-- Do NOT start with “Welcome to”, “Introducing”, “Step inside”, or similar generic openings.
-- Do NOT start with the property’s address or location.
-- Begin with vivid and factual details that spark curiosity or emotion.
-- Examples of strong hooks:
-    - “Panoramic ocean views frame every room in this coastal masterpiece.”
-    - “A private backyard oasis awaits with a resort-style pool and spa.”
-    - “Vaulted ceilings and skylights flood the open-concept living area with light.”
-- Examples of weak hooks to avoid:
-    - “Welcome to this beautiful home…”
-    - “Introducing our latest listing…”
-    - “Step inside and discover…”
-- Use the upgrades/features and neighborhood notes to reach the target length—be factual.
-- No exaggerated claims; avoid steering; no terms implying a protected class.
-- Replace subjective school/safety claims with neutral proximity phrasing (“near local schools,” “close to parks”).
-- Plain language; avoid fluff/clichés; vary sentence length.
-- For the video script: opening hook, 3–5 key features, 1 lifestyle/neighborhood beat, soft CTA (“Schedule a tour to see it in person.”). No phone numbers.
-
-Output JSON example:
-{{
-  "mls_description": "…",
-  "social_caption": "…",
-  "instagram_hashtags": "#sandiegorealestate #listings …",
-  "video_script_60s": "…"
-}}
-""".strip()
-
-def safe_json_extract(text: str) -> Dict[str, Any]:
-    text = text or ""
-    try:
-        return json.loads(text)
-    except json.JSONDecodeError:
-        start = text.find("{")
-        end = text.rfind("}")
-        if start != -1 and end != -1 and end > start:
-            return json.loads(text[start:end+1])
-        raise
-
-def chat_raw(system_prompt: str, user_prompt: str, temperature: float) -> str:
-    resp = client.chat.completions.create(
-        model=MODEL_NAME,
-        messages=[{"role": "system", "content": system_prompt},
-                  {"role": "user", "content": user_prompt}],
-        temperature=temperature
-    )
-    return resp.choices[0].message.content or ""
-
-def chat_json(system_prompt: str, user_prompt: str, temperature: float):
-    raw = chat_raw(system_prompt, user_prompt, temperature)
-    return safe_json_extract(raw), raw
-
-def merge_preserving(original: Dict[str, Any], updates: Dict[str, Any]) -> Dict[str, Any]:
-    out = dict(original or {})
-    for k, v in (updates or {}).items():
-        out[k] = v
-    return out
-
-def validate_and_repair(li: ListingInput, data: Dict[str, Any]) -> Dict[str, Any]:
-    system = "You are a meticulous, compliant real estate listing copywriter."
-    min_chars = int(li.mls_char_limit * 0.9)
-
-    missing = [k for k in REQUIRED_KEYS if not (isinstance(data.get(k), str) and data.get(k).strip())]
-    if not missing:
-        return data
-
-    shared_ctx = f"""
-Address: {li.address}, {li.city}, {li.state} {li.zip_code}
-Type: {li.property_type}
-Beds/Baths: {li.beds} bd / {li.baths} ba | Sq Ft: {li.sqft} | Lot: {li.lot_size} | Year: {li.year_built} | Price: {li.price}
-Keywords: {", ".join(li.keywords)}
-Upgrades (bulleted):
-{li.upgrades_bullets}
-Neighborhood: {li.neighborhood_notes}
-Highlight features: {", ".join(li.highlight_features)}
-Tone: {li.tone}
-"""
-
-    for key in missing:
-        if key == "social_caption":
-            prompt = f"""
-Using this property context:
-{shared_ctx}
-
-Write ONLY JSON with:
-{{"social_caption": "<1–2 sentence caption (no hashtags) in a friendly {li.tone.lower()} tone>"}}
-"""
-        elif key == "instagram_hashtags":
-            prompt = f"""
-Using this property context:
-{shared_ctx}
-
-Write ONLY JSON with:
-{{"instagram_hashtags": "<10–18 space-separated Instagram hashtags, no commas>"}}
-Prefer local + lifestyle + property-type tags. No emojis.
-"""
-        elif key == "video_script_60s":
-            prompt = f"""
-Using this property context:
-{shared_ctx}
-
-Write ONLY JSON with:
-{{"video_script_60s": "<45–60 second walkthrough script. Hook, 3–5 key features, 1 lifestyle/neighborhood beat, soft CTA. No phone numbers.>"}}
-Use short sentences that read well on camera.
-"""
-        elif key == "mls_description":
-            prompt = f"""
-Using this property context:
-{shared_ctx}
-
-Write ONLY JSON with:
-{{"mls_description": "<MLS description between {min_chars} and {li.mls_char_limit} characters, no emojis>"}}
-Be compliant. Replace subjective school/safety claims with neutral proximity phrasing.
-"""
-        else:
-            continue
-
-        partial, _ = chat_json(system, prompt, temperature=0.45)
-        data = merge_preserving(data, partial)
-
-    return data
-
-def ensure_length(li: ListingInput, data: Dict[str, Any]) -> Dict[str, Any]:
-    min_chars = int(li.mls_char_limit * 0.9)
-    max_chars = li.mls_char_limit
-    current = (data.get("mls_description") or "").strip()
-
-    if min_chars <= len(current) <= max_chars:
-        return data
-
-    system = "You are a meticulous, compliant real estate listing copywriter."
-    prompt = f"""
-Revise the following MLS description to be between {min_chars} and {max_chars} characters.
-Keep meaning and compliance. Add concrete, factual property details where helpful.
-Return ONLY JSON with this single key:
-{{"mls_description": "…"}}
-
-Current (length {len(current)}):
-<<<{current}>>>
-""".strip()
-
-    revision_json, _ = chat_json(system, prompt, temperature=0.5 if li.detail_level != "Concise" else 0.35)
-    revised_desc = (revision_json.get("mls_description") or "").strip()
-    if revised_desc:
-        data["mls_description"] = revised_desc
-    return data
-
-# ---------- UI ----------
-st.title("🏠 AI Listing Writer")
-st.caption("Check the features, and we’ll generate an MLS-ready description, a social caption, hashtags, and a 60-second video script.")
-
-with st.sidebar:
-    st.markdown("### Settings")
-    detail_level = st.selectbox("Detail Level", ["Concise", "Standard", "Descriptive"], index=2)
-    mls_char_limit = st.slider("MLS Character Limit", min_value=500, max_value=1800, value=1800, step=50)
-
-# Precompute taxonomy/groups so they're available outside the form as well
-tax = feature_taxonomy()
-groups = list(tax.keys())
-
-# -------- Property Basics (COMPACT) --------
-st.subheader("Property Basics")
-
-# Full-width street address (usually needs space)
-address = st.text_input("Street Address*", placeholder="123 Main St")
-
-# City / State / ZIP on one row
-c1, c2, c3 = st.columns([2, 0.7, 1])
-with c1:
-    city = st.text_input("City*", placeholder="San Diego")
-with c2:
-    state = st.text_input("State*", value="CA")
-with c3:
-    zip_code = st.text_input("ZIP*", placeholder="92101")
-
-# Beds / Baths / Sq Ft / Lot Size on one row
-r1c1, r1c2, r1c3, r1c4 = st.columns([1, 1, 1, 1])
-with r1c1:
-    beds = st.number_input("Bedrooms", min_value=0.0, step=0.5, value=3.0)
-with r1c2:
-    baths = st.number_input("Bathrooms", min_value=0.0, step=0.5, value=2.0)
-with r1c3:
-    sqft = st.number_input("Interior Sq Ft", min_value=0, step=50, value=1600)
-with r1c4:
-    lot_size = st.number_input("Lot Size (sq ft)", min_value=0, step=100, value=5000)
-
-# Year Built / List Price / Property Type / Tone on one row
-r2c1, r2c2, r2c3, r2c4 = st.columns([1, 1.2, 1.3, 1.3])
-with r2c1:
-    year_built = st.number_input("Year Built", min_value=1800, max_value=2100, value=1995)
-with r2c2:
-    price = st.number_input("List Price", min_value=0, step=5000, value=799000)
-with r2c3:
-    property_type = st.selectbox(
-        "Property Type",
-        ["Single Family", "Condo", "Townhome", "Multi-Unit", "Luxury", "Investment"]
-    )
-with r2c4:
-    tone = st.selectbox(
-        "Tone (How do you want your description to feel)",
-        ["Professional", "Warm & Inviting", "Luxury", "Investor-Focused", "Coastal Vibes"]
-    )
-
-# Target Buyer Profile / Neighborhood Notes (two-up, with notes wider)
-r3c1, r3c2 = st.columns([1.2, 2])
-with r3c1:
-    target_buyer_profile = st.text_input(
-        "Target Buyer Profile",
-        "Move-up buyers who value indoor-outdoor living"
-    )
-with r3c2:
-    neighborhood_notes = st.text_area(
-        "Neighborhood Notes (proximity phrasing only)",
-        "Near parks and local schools; quick access to I-15; minutes to shops and cafes.",
-        height=80
-    )
-
-st.markdown("---")
-
-
-# -------- Features (BELOW property basics) --------
-st.subheader("Features (check all that apply)")
-with st.form("features_form", clear_on_submit=False):
-    feat_cols = st.columns(2)
-
-    def _group_key(idx: int) -> str:
-        return f"sel_group_{idx}"
-
-    # Collect within this form run (commit on Apply)
-    new_selected_by_key: Dict[str, List[str]] = {}
-
-    for i, group in enumerate(groups):
-        all_labels = [label for (label, _v) in tax[group]]
-        key = _group_key(i)
-        current_selected = st.session_state.get(key, [])
-
-        with feat_cols[i % 2]:
-            with st.expander(group, expanded=False):
-                new_visible = st.multiselect(
-                    label=f"{group} features",
-                    options=all_labels,
-                    default=[x for x in current_selected if x in all_labels],
-                    key=f"ui_{key}",
-                    label_visibility="collapsed",
-                    placeholder="Select one or more features"
-                )
-                new_selected_by_key[key] = new_visible
-
-    # Form button
-    applied = st.form_submit_button("Apply feature selections")
-
-    if applied:
-        # Commit the selections
-        for key, new_list in new_selected_by_key.items():
-            st.session_state[key] = new_list
-        st.toast("Applied!", icon="✅")
-
-# Assemble selection dict from session_state
-selections: Dict[str, List[str]] = {group: [] for group in groups}
-for i, group in enumerate(groups):
-    selections[group] = st.session_state.get(f"sel_group_{i}", [])
-
-# ---- Optional extra keywords (BEFORE generation) ----
-st.session_state.setdefault("extra_keywords_raw", "")
-extra_kw_raw = st.text_input("Additional Keywords and Features", key="extra_keywords_raw")
-
-# robust split on commas / semicolons / new lines
-extra_keywords = [k.strip() for k in re.split(r"[,\n;]+", extra_kw_raw) if k.strip()]
-
-st.markdown("---")
-submitted = st.button("Start Generating")
-
-# ---------- Generate ----------
-if submitted:
-    if not address or not city or not state or not zip_code:
-        st.error("Please fill in the address, city, state, and ZIP.")
-        st.stop()
-
-    auto_keywords = build_keywords_from_selections(
-        selected=selections,
-        beds=beds,
-        baths=baths,
-        sqft=int(sqft) if sqft else None,
-        lot_size=int(lot_size) if lot_size else None,
-        year_built=int(year_built) if year_built else None,
-        property_type=property_type,
-        extra_keywords=[],
-    )
-    # Add user-provided extras
-    auto_keywords.extend([k.lower() for k in extra_keywords])
-
-    upgrades_bullets = build_upgrades_bullets(selections, custom_lines=[])
-
-    li = ListingInput(
-        address=address, city=city, state=state, zip_code=zip_code,
-        beds=beds, baths=baths, sqft=int(sqft) if sqft else None, lot_size=int(lot_size) if lot_size else None,
-        year_built=int(year_built) if year_built else None, property_type=property_type,
-        price=int(price) if price else None, keywords=auto_keywords,
-        upgrades_bullets=upgrades_bullets, neighborhood_notes=neighborhood_notes,
-        target_buyer_profile=target_buyer_profile, tone=tone,
-        mls_char_limit=int(mls_char_limit), detail_level=detail_level,
-        highlight_features=[]  # wire back if you want a highlight picker
-    )
-
-    with st.spinner("Generating polished copy..."):
-        try:
-            data, _ = chat_json(
-                "You are a meticulous, compliant real estate listing copywriter.",
-                build_primary_prompt(li),
-                temperature=0.5 if li.detail_level == "Standard" else (0.65 if li.detail_level == "Descriptive" else 0.35),
-            )
-            data = validate_and_repair(li, data)
-            data = ensure_length(li, data)
-        except Exception as e:
-            st.exception(e)
-            st.stop()
-
-    # ------------- Outputs -------------
-    st.subheader("MLS Description")
-    mls_text = (data.get("mls_description") or "").strip()
-    st.write(mls_text)
-    st.caption(f"Character count: {len(mls_text)} / {li.mls_char_limit}")
-
-    st.subheader("Social Caption")
-    social_caption = (data.get("social_caption") or "").strip()
-    st.write(social_caption if social_caption else "— (not generated)")
-
-    st.subheader("Instagram Hashtags")
-    hashtags_raw = (data.get("instagram_hashtags") or "").strip()
-    if hashtags_raw:
-        # Split on spaces and enforce '#' prefix
-        hashtag_list = hashtags_raw.split()
-        hashtag_list = [tag if tag.startswith('#') else f'#{tag}' for tag in hashtag_list]
-        hashtags_formatted = ' '.join(hashtag_list)
-        st.text(hashtags_formatted)  # use text() to preserve spacing
-    else:
-        st.write("— (not generated)")
-
-    st.subheader("60-Second Video Script")
-    video_script = (data.get("video_script_60s") or "").strip()
-    st.write(video_script if video_script else "— (not generated)")
-
-    st.success("Done! Review for accuracy/compliance before posting.")
-
-    st.markdown("---")
-    st.subheader("Auto-Generated Inputs (for reference)")
-    st.caption("These are the inputs we fed into the model—edit your selections and regenerate if needed.")
-    st.markdown("**Upgrades/Features (bulleted)**")
-    st.code(upgrades_bullets or "(none)", language="markdown")
-    st.markdown("**SEO Keywords (auto-built)**")
-    st.code(", ".join(auto_keywords) or "(none)", language="text")
+# app.py
+# AI Listing Writer – Local Streamlit app (no MLS; features inside a FORM so dropdowns don't close)
+# - Fixed model: gpt-4.1-mini
+# - Grouped feature selectors (no search bar)
+# - Auto-generates: Upgrades/Features bullets + SEO keywords from selections (+ optional extras)
+# - Robust JSON handling + self-repair for missing fields
+# - Character range enforcement for MLS description
+# Run: streamlit run app.py
+
+import asyncio
+import functools
+import hashlib
+import io
+import itertools
+import json
+import math
+import os
+import re
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from typing import List, Optional, Dict, Any, Tuple
+
+import streamlit as st
+from dotenv import load_dotenv
+from openai import AsyncOpenAI, OpenAI, RateLimitError
+
+# ---------- Setup (cloud + local) ----------
+
+# Secrets/env are parsed once per process, not on every widget-driven rerun.
+@st.cache_resource
+def load_settings() -> Tuple[Optional[str], Optional[str]]:
+    load_dotenv()  # lets local .env work
+    # Read from Streamlit Secrets first (cloud), then .env (local)
+    return (
+        st.secrets.get("OPENAI_API_KEY") or os.getenv("OPENAI_API_KEY"),
+        st.secrets.get("APP_PASSWORD") or os.getenv("APP_PASSWORD"),
+    )
+
+OPENAI_API_KEY, APP_PASSWORD = load_settings()
+
+st.set_page_config(page_title="AI Listing Writer (Beta)", page_icon="🏠", layout="wide")
+
+if not OPENAI_API_KEY:
+    st.error("Missing OPENAI_API_KEY (set it in Streamlit → Settings → Secrets, or your local .env).")
+    st.stop()
+
+# ---- Tiny password gate (beta) ----
+def check_password():
+    # already authenticated?
+    if st.session_state.get("authed"):
+        with st.sidebar:
+            if st.button("Log out"):
+                st.session_state["authed"] = False
+                st.rerun()
+        return True
+
+    st.title("AI Listing Writer — Beta Access")
+    pw = st.text_input("Enter beta password", type="password")
+    if st.button("Enter"):
+        if APP_PASSWORD and pw == APP_PASSWORD:
+            st.session_state["authed"] = True
+            st.rerun()
+        else:
+            st.error("Incorrect password")
+    st.stop()
+
+# gate the app
+if not check_password():
+    st.stop()
+
+# ---------- Model ----------
+MODEL_NAME = "gpt-4.1-mini"  # default for repairs/aux fields
+PREMIUM_MODEL = "gpt-4.1"
+
+# Constrained-format copy doesn't need a flagship model at every detail
+# level: smaller tiers cut TTFT/TTLT substantially at similar quality.
+MODEL_TIERS = {
+    "Concise": "gpt-4.1-mini",
+    "Standard": "gpt-4o-mini",
+    "Descriptive": PREMIUM_MODEL,
+}
+
+def select_model(detail_level: str) -> str:
+    if st.session_state.get("force_premium_model"):
+        return PREMIUM_MODEL
+    return MODEL_TIERS.get(detail_level, MODEL_NAME)
+
+# OpenAI clients (sync for the main flow, async for concurrent repair calls),
+# instantiated once per process so reruns reuse the HTTP session.
+@st.cache_resource
+def get_client() -> OpenAI:
+    c = OpenAI(api_key=OPENAI_API_KEY)
+    # Warm-up ping at boot: pays the TLS handshake (and seeds any
+    # provider-side routing) before the user's first submit instead of on
+    # it. Failures are ignored — the first real call then warms as before.
+    try:
+        c.chat.completions.create(
+            model=MODEL_NAME, max_tokens=1,
+            messages=[{"role": "user", "content": "ping"}],
+        )
+    except Exception:
+        pass
+    return c
+
+@st.cache_resource
+def get_async_client() -> AsyncOpenAI:
+    return AsyncOpenAI(api_key=OPENAI_API_KEY)
+
+client = get_client()
+aclient = get_async_client()
+
+# ---------- Data model ----------
+# frozen + slots: hashable (usable as a cache key), smaller per-instance
+# footprint, faster attribute access.
+@dataclass(slots=True, frozen=True)
+class ListingInput:
+    address: str
+    city: str
+    state: str
+    zip_code: str
+    beds: Optional[float]
+    baths: Optional[float]
+    sqft: Optional[int]
+    lot_size: Optional[int]
+    year_built: Optional[int]
+    property_type: str
+    price: Optional[int]
+    # Derived from selections:
+    keywords: Tuple[str, ...]
+    upgrades_bullets: str
+    # Free text:
+    neighborhood_notes: str
+    target_buyer_profile: str
+    tone: str
+    mls_char_limit: int
+    detail_level: str  # "Concise", "Standard", "Descriptive"
+    highlight_features: Tuple[str, ...]  # prioritized features to emphasize
+    upgrades_ids: str = ""  # ID-coded upgrades for the primary prompt (see FEATURE_LEGEND)
+    batch_mode: bool = False  # use OpenAI Batch API for repairs (bulk/non-interactive runs)
+
+# ---------- Feature Taxonomy ----------
+# Built once at import time — Streamlit reruns the whole script on every widget
+# interaction, so rebuilding this big nested dict per run is wasted work.
+_TAXONOMY: Dict[str, List[Tuple[str, List[str]]]] = {
+        "Exterior & Lot": [
+            ("Corner lot", ["corner lot"]),
+            ("Cul-de-sac", ["cul-de-sac"]),
+            ("Large backyard", ["large backyard", "spacious yard", "big yard"]),
+            ("Usable yard", ["usable yard", "flat yard"]),
+            ("Drought-tolerant landscaping", ["drought tolerant", "low maintenance landscaping"]),
+            ("Mature trees", ["mature trees"]),
+            ("Fruit trees", ["fruit trees"]),
+            ("Garden beds", ["garden beds"]),
+            ("RV/Boat parking", ["rv parking", "boat parking"]),
+            ("Gated driveway", ["gated driveway"]),
+            ("Circular driveway", ["circular driveway"]),
+            ("Motor court", ["motor court"]),
+            ("Privacy fencing", ["privacy fencing"]),
+            ("Privacy hedges", ["privacy hedges"]),
+            # Garage sizes & details
+            ("1-car garage", ["1-car garage", "single car garage"]),
+            ("2-car garage", ["2-car garage", "two car garage"]),
+            ("3-car garage", ["3-car garage", "three car garage"]),
+            ("4-car garage", ["4-car garage", "four car garage"]),
+            ("5-car+ garage", ["5-car garage", "five car garage"]),
+            ("Tandem garage", ["tandem garage"]),
+            ("Detached garage", ["detached garage"]),
+            ("Workshop area", ["garage workshop", "workbench"]),
+            ("Built-in garage storage", ["garage storage", "built-in garage cabinets"]),
+            ("EV charger (Level 2)", ["ev charger", "240v outlet"]),
+        ],
+        "Outdoor Living": [
+            ("Covered patio", ["covered patio"]),
+            ("Pergola", ["pergola"]),
+            ("Gazebo", ["gazebo"]),
+            ("Retractable awning", ["retractable awning"]),
+            ("Deck (wood)", ["wood deck"]),
+            ("Deck (composite)", ["composite deck"]),
+            ("Rooftop deck", ["rooftop deck"]),
+            ("Wraparound porch", ["wraparound porch"]),
+            ("Balcony", ["balcony"]),
+            ("Built-in BBQ", ["built-in bbq"]),
+            ("Outdoor kitchen (sink/fridge)", ["outdoor kitchen", "outdoor sink", "outdoor fridge"]),
+            ("Bar seating", ["bar seating"]),
+            ("Fire pit", ["fire pit"]),
+            ("Outdoor fireplace", ["outdoor fireplace"]),
+            ("Water feature (fountain/pond/waterfall)", ["water feature", "fountain", "pond", "waterfall"]),
+            ("Putting green", ["putting green"]),
+            ("Sport court", ["sport court"]),
+            ("Pickleball", ["pickleball"]),
+            ("Play structure", ["play structure"]),
+            ("Dog run", ["dog run"]),
+            # Pool / spa / sauna
+            ("Pool (in-ground)", ["pool", "in-ground pool"]),
+            ("Pool (saltwater)", ["saltwater pool"]),
+            ("Pool (heated)", ["heated pool"]),
+            ("Lap pool", ["lap pool"]),
+            ("Spa/Hot tub", ["spa", "hot tub"]),
+            ("Sauna (dry)", ["dry sauna"]),
+            ("Sauna (infrared)", ["infrared sauna"]),
+        ],
+        "Views & Orientation": [
+            ("Ocean view", ["ocean view"]),
+            ("Bay view", ["bay view"]),
+            ("City lights view", ["city lights view"]),
+            ("Mountain view", ["mountain view"]),
+            ("Canyon/Greenbelt view", ["canyon view", "greenbelt view"]),
+            ("Golf course view", ["golf course view"]),
+            ("Park view", ["park view"]),
+            ("East-facing (morning light)", ["east-facing"]),
+            ("West-facing (sunsets)", ["west-facing"]),
+            ("South-facing yard", ["south-facing yard"]),
+            ("Picture windows", ["picture windows"]),
+            ("Bay window", ["bay window"]),
+        ],
+        "Property Type & Layout": [
+            ("Single-story (step-free)", ["single story", "single level", "step-free"]),
+            ("Two-story", ["two story"]),
+            ("Split-level", ["split level"]),
+            ("Open-concept", ["open concept", "open floor plan"]),
+            ("Great room", ["great room"]),
+            ("Vaulted ceilings", ["vaulted ceilings"]),
+            ("Double-height ceilings", ["double-height ceilings"]),
+            ("Skylights", ["skylights"]),
+            ("Formal dining", ["formal dining"]),
+            ("Den/Home office", ["den", "home office"]),
+            ("Loft", ["loft"]),
+            ("Media room/Home theater", ["media room", "home theater"]),
+            ("Game room", ["game room"]),
+            ("Gym", ["home gym"]),
+            ("Mudroom", ["mudroom"]),
+            ("ADU (permitted)", ["adu"]),
+            ("Guest house/Casita (permitted)", ["guest house", "casita"]),
+            ("Primary suite on main", ["primary on main"]),
+            ("Dual primary suites", ["dual primary"]),
+            ("Jack-and-Jill bath", ["jack and jill"]),
+            ("En-suite secondaries", ["en-suite bedrooms"]),
+            ("Built-ins", ["built-ins"]),
+            ("Window seats", ["window seats"]),
+            ("Wainscoting/Trim/Crown", ["wainscoting", "crown molding", "trim work"]),
+            ("Recessed lighting", ["recessed lighting"]),
+            ("Statement lighting", ["statement lighting"]),
+            ("Fireplace(s)", ["fireplace"]),
+        ],
+        "Kitchen": [
+            ("Newly updated kitchen", ["updated kitchen", "renovated kitchen"]),
+            ("Quartz countertops", ["quartz countertops"]),
+            ("Granite countertops", ["granite countertops"]),
+            ("Quartzite countertops", ["quartzite"]),
+            ("Marble countertops", ["marble"]),
+            ("Butcher block counters", ["butcher block"]),
+            ("Soft-close cabinets", ["soft close cabinets"]),
+            ("Walk-in pantry", ["walk-in pantry"]),
+            ("Glass uppers", ["glass uppers"]),
+            ("Custom millwork", ["custom cabinets"]),
+            ("Island with seating", ["kitchen island with seating"]),
+            ("Waterfall edge", ["waterfall island"]),
+            ("Prep sink", ["prep sink"]),
+            ("Stainless appliances", ["stainless steel appliances"]),
+            ("Panel-ready/built-in fridge", ["panel ready appliances", "built-in fridge"]),
+            ("Gas range", ["gas range"]),
+            ("Professional range (36\")", ["36-inch range", "professional range"]),
+            ("Professional range (48\")", ["48-inch range", "professional range"]),
+            ("Double oven", ["double oven"]),
+            ("Convection/steam oven", ["convection oven", "steam oven"]),
+            ("Pot filler", ["pot filler"]),
+            ("Vented hood", ["vented hood"]),
+            ("Farmhouse sink", ["farmhouse sink"]),
+            ("Touch faucet", ["touch faucet"]),
+            ("Water filtration/RO", ["water filtration", "reverse osmosis"]),
+            ("Beverage center/coffee bar", ["beverage center", "coffee bar"]),
+            ("Wine fridge", ["wine fridge"]),
+            ("Microwave drawer", ["microwave drawer"]),
+            ("Designer backsplash", ["designer backsplash"]),
+        ],
+        "Bathrooms": [
+            ("Double vanity", ["double vanity"]),
+            ("Soaking tub", ["soaking tub"]),
+            ("Separate shower", ["separate shower"]),
+            ("Walk-in/curbless shower", ["walk-in shower", "curbless shower"]),
+            ("Rain shower", ["rain shower"]),
+            ("Body sprays", ["body sprays"]),
+            ("Frameless glass", ["frameless glass"]),
+            ("Heated floors", ["heated floors"]),
+            ("Towel warmer", ["towel warmer"]),
+            ("Bidet/bidet seat", ["bidet", "bidet seat"]),
+            ("Smart mirror", ["smart mirror", "backlit mirror"]),
+            ("Smart lighting (bath)", ["smart bath lighting"]),
+            ("Linen closet", ["linen closet"]),
+            ("Updated powder room", ["updated powder room"]),
+            ("Skylight in bath", ["bath skylight"]),
+        ],
+        "Bedrooms & Storage": [
+            ("Primary walk-in closet", ["walk-in closet"]),
+            ("Custom closet system", ["custom closets"]),
+            ("Primary balcony", ["primary balcony"]),
+            ("Primary retreat/sitting area", ["primary retreat"]),
+            ("Fireplace in primary", ["primary fireplace"]),
+            ("Large secondary bedrooms", ["large secondary bedrooms"]),
+            ("Guest suite", ["guest suite"]),
+            ("Nursery", ["nursery"]),
+            ("Coat closet", ["coat closet"]),
+            ("Linen storage", ["linen storage"]),
+            ("Attic storage", ["attic storage"]),
+            ("Shed/Outbuilding", ["storage shed", "outbuilding"]),
+            ("Overhead garage racks", ["garage racks"]),
+        ],
+        "Laundry & Utility": [
+            ("Inside laundry room", ["laundry room"]),
+            ("Garage laundry", ["garage laundry"]),
+            ("Closet laundry", ["closet laundry"]),
+            ("Laundry sink", ["laundry sink"]),
+            ("Folding counter", ["folding counter"]),
+            ("Laundry cabinetry", ["laundry cabinets"]),
+            ("Hanging rack", ["hanging rack"]),
+            ("Gas hookups", ["gas hookups"]),
+            ("Electric hookups (220V)", ["electric hookups", "220v laundry"]),
+        ],
+        "Flooring & Surfaces": [
+            ("Hardwood/Wood floors", ["hardwood floors", "wood floors"]),
+            ("Luxury vinyl plank (LVP)", ["lvp flooring"]),
+            ("Tile (porcelain/ceramic)", ["tile floors"]),
+            ("Stone (travertine/marble/slate)", ["stone floors", "travertine", "marble", "slate"]),
+            ("Polished concrete", ["polished concrete"]),
+            ("New carpet", ["new carpet"]),
+            ("Hypoallergenic flooring", ["hypoallergenic flooring"]),
+        ],
+        "Systems, Energy & Smart Home": [
+            ("Solar (owned)", ["owned solar"]),
+            ("Solar (leased)", ["leased solar"]),
+            ("Battery backup", ["battery backup"]),
+            ("Generator transfer switch", ["generator transfer switch"]),
+            ("Dual-pane windows", ["dual pane windows"]),
+            ("Energy-efficient glazing", ["energy efficient windows"]),
+            ("Upgraded insulation (attic/crawl)", ["attic insulation", "crawlspace insulation"]),
+            ("Tankless water heater", ["tankless water heater"]),
+            ("Newer HVAC", ["newer hvac"]),
+            ("Multi-zone HVAC", ["multi-zone hvac"]),
+            ("Whole-house fan", ["whole house fan"]),
+            ("Smart thermostat", ["smart thermostat"]),
+            ("Video doorbell", ["video doorbell"]),
+            ("Security cameras", ["security cameras"]),
+            ("Smart locks", ["smart locks"]),
+            ("Smart lighting", ["smart lighting"]),
+            ("Wired Ethernet (CAT6)", ["cat6 wiring", "ethernet wiring"]),
+            ("Speaker pre-wire", ["speaker prewire"]),
+            ("Security system", ["security system"]),
+            ("Interior fire sprinklers", ["fire sprinklers"]),
+            ("Smart smoke detectors", ["smart smoke detectors"]),
+            ("Smart CO detectors", ["smart co detectors"]),
+            ("Fresh-air system/ERV", ["erv", "fresh air system"]),
+            ("Air purifier", ["air purifier"]),
+            ("Low-VOC finishes", ["low voc finishes"]),
+        ],
+        "Community & HOA": [
+            ("Gated community", ["gated community"]),
+            ("Guard-gated community", ["guard gated"]),
+            ("Community pool", ["community pool"]),
+            ("Community spa", ["community spa"]),
+            ("Clubhouse", ["clubhouse"]),
+            ("Gym/Fitness center", ["fitness center"]),
+            ("Pickleball courts", ["pickleball"]),
+            ("Tennis courts", ["tennis courts"]),
+            ("Playground", ["playground"]),
+            ("Dog park", ["dog park"]),
+            ("Walking trails", ["walking trails"]),
+            ("Community garden", ["community garden"]),
+            ("Package lockers", ["package lockers"]),
+            ("Community RV lot", ["community rv lot"]),
+        ],
+        "Location & Access": [
+            ("Near parks", ["near parks"]),
+            ("Near trails", ["near trails"]),
+            ("Near shopping", ["near shopping"]),
+            ("Near dining", ["near dining"]),
+            ("Near hospitals/medical", ["near hospitals", "near medical"]),
+            ("Easy freeway access", ["easy freeway access"]),
+            ("Near I-5", ["near i-5"]),
+            ("Near I-15", ["near i-15"]),
+            ("Near local schools (proximity)", ["near local schools"]),
+            ("Transit nearby", ["near transit"]),
+        ],
+        "Specialty / Market Segments": [
+            ("Accessibility: zero-step entry", ["zero step entry", "step-free"]),
+            ("Accessibility: wide halls/doors", ["wide hallways", "wide doors"]),
+            ("Roll-in/curbless shower", ["roll-in shower", "curbless shower"]),
+            ("New construction/recent build", ["new construction", "recent build"]),
+            ("Craftsman style", ["craftsman"]),
+            ("Spanish/Mediterranean style", ["spanish", "mediterranean"]),
+            ("Mid-Century style", ["mid-century"]),
+            ("Modern/Contemporary", ["modern", "contemporary"]),
+            ("Farmhouse/Tudor", ["farmhouse", "tudor"]),
+            ("Income/ADU/lock-off", ["adu potential", "separate entrance", "lock off"]),
+            ("Well", ["well"]),
+            ("Septic (updated)", ["septic updated"]),
+            ("Workshop/Barn/Studio", ["workshop", "barn", "artist studio"]),
+        ],
+    }
+
+# Precomputed lookups over the static taxonomy (tuples: smaller, faster to walk)
+LABEL_TO_VARIANTS: Dict[str, Tuple[str, ...]] = {
+    label: tuple(variants) for items in _TAXONOMY.values() for (label, variants) in items
+}
+GROUP_LABELS: Dict[str, List[str]] = {
+    group: [label for (label, _v) in items] for group, items in _TAXONOMY.items()
+}
+GROUP_LABEL_SETS: Dict[str, frozenset] = {
+    group: frozenset(labels) for group, labels in GROUP_LABELS.items()
+}
+
+# Compact stable IDs for each label: prompts ship "F041, F042" plus one static
+# legend instead of repeating full English labels, cutting input tokens. The
+# legend lives in the static system prompt, so providers can prefix-cache it.
+LABEL_IDS: Dict[str, str] = {
+    label: f"F{i:03d}" for i, label in enumerate(sorted(LABEL_TO_VARIANTS))
+}
+FEATURE_LEGEND = "\n".join(
+    f"{fid} = {label}" for label, fid in sorted(LABEL_IDS.items(), key=lambda kv: kv[1])
+)
+
+def feature_taxonomy() -> Dict[str, List[Tuple[str, List[str]]]]:
+    return _TAXONOMY
+
+# Ordered tuple for UI default seeding; frozenset for O(1) membership checks.
+HEADLINE_DEFAULTS_ORDERED = (
+    "Pool (in-ground)", "Spa/Hot tub", "Ocean view", "Mountain view",
+    "Large backyard", "Open-concept", "ADU (permitted)", "Guest house/Casita (permitted)",
+    "Solar (owned)", "Single-story (step-free)", "2-car garage", "3-car garage", "4-car garage"
+)
+HEADLINE_DEFAULTS = frozenset(HEADLINE_DEFAULTS_ORDERED)
+
+# ---------- Keyword & Upgrades builders ----------
+_WS_RE = re.compile(r"\s+")
+_STRIP_TBL = str.maketrans({",": " ", ";": " "})
+# Map the extra-keywords delimiters to one sentinel so a plain str.split
+# replaces the regex engine for this hot little parse.
+_KW_TRANS = str.maketrans({",": "\x1f", ";": "\x1f", "\n": "\x1f"})
+
+def _opt_int(v: Any) -> Optional[int]:
+    """Coerce a numeric widget value to int, treating 0/empty as unset."""
+    return int(v) if v else None
+
+# Input validators, compiled once — a bad ZIP should cost microseconds,
+# not a wasted multi-second LLM call.
+_ZIP_RE = re.compile(r"^\d{5}(-\d{4})?$")
+_STATE_RE = re.compile(r"^[A-Z]{2}$")
+
+def _normalize_token(t: Any) -> str:
+    # translate + one regex pass + casefold: single C-level pipeline per token
+    return _WS_RE.sub(" ", str(t).translate(_STRIP_TBL)).strip().casefold()
+
+# Both builders are pure, so identical selections reuse the cached result
+# instead of redoing the normalization/dedup pass on every rerun.
+# max_entries bounds memory for long-lived multi-user sessions.
+@st.cache_data(show_spinner=False, max_entries=256)
+def build_keywords_from_selections(
+    selected: Dict[str, List[str]],
+    beds: Optional[float],
+    baths: Optional[float],
+    sqft: Optional[int],
+    lot_size: Optional[int],
+    year_built: Optional[int],
+    property_type: str,
+    extra_keywords: List[str]
+) -> List[str]:
+    tokens: List[str] = []
+
+    for group, labels in selected.items():
+        for label in labels:
+            variants = LABEL_TO_VARIANTS.get(label, ())
+            if variants:
+                tokens.extend(variants)
+            else:
+                tokens.append(label)
+
+    if beds:
+        tokens.append(f"{int(beds)} bedrooms")
+    if baths is not None:
+        tokens.append(f"{baths} bathrooms")
+    if sqft:
+        tokens.append(f"{int(sqft)} sqft")
+    if lot_size:
+        tokens.append(f"{int(lot_size)} sf lot")
+    if year_built:
+        tokens.append(f"built {int(year_built)}")
+    if property_type:
+        tokens.append(property_type.lower())
+
+    tokens.extend([k.strip() for k in extra_keywords if k.strip()])
+
+    # dict preserves insertion order, so this dedups in one C-level pass
+    return list(dict.fromkeys(
+        t2 for t in tokens if (t2 := _normalize_token(t))
+    ))[:60]
+
+@st.cache_data(show_spinner=False, max_entries=256)
+def build_upgrades_ids(selected: Dict[str, List[str]]) -> str:
+    """ID-coded upgrades payload for the primary prompt (see FEATURE_LEGEND)."""
+    lines: List[str] = []
+    for group, labels in selected.items():
+        if not labels:
+            continue
+        lines.append(f"- {group}: " + ", ".join(LABEL_IDS.get(label, label) for label in labels))
+    return "\n".join(lines[:30])
+
+def _iter_upgrade_lines(selected: Dict[str, List[str]], custom_lines: List[str]):
+    for group, labels in selected.items():
+        if labels:
+            yield f"- {group}: " + ", ".join(labels)
+    for raw in custom_lines:
+        val = " ".join(raw.split())
+        if val:
+            yield f"- {val}"
+
+@st.cache_data(show_spinner=False, max_entries=256)
+def build_upgrades_bullets(selected: Dict[str, List[str]], custom_lines: List[str]) -> str:
+    # One C-level join over a generator; islice stops formatting at the cap
+    # instead of building the full list and slicing it.
+    return "\n".join(itertools.islice(_iter_upgrade_lines(selected, custom_lines), 30))
+
+# ---------- Prompt + Model flow ----------
+REQUIRED_KEYS = ["mls_description", "social_caption", "instagram_hashtags", "video_script_60s"]
+
+def detail_level_guidance(level: str) -> str:
+    if level == "Concise":
+        return "Aim for the LOWER end of the allowed range. Use concise, information-dense sentences."
+    if level == "Descriptive":
+        return "Aim for the UPPER end of the allowed range. Add factual details drawn from inputs."
+    return "Aim for the MIDDLE of the allowed range with balanced clarity."
+
+COPYWRITER_SYSTEM_PROMPT = "You are a meticulous, compliant real estate listing copywriter."
+
+# Static instructions live in the system message so only the compact JSON
+# context below is retokenized per listing.
+PRIMARY_SYSTEM_PROMPT = """
+You are an expert real estate copywriter for MLS, Zillow/Redfin, and social media.
+Write compelling, accurate, compliant copy. Avoid fair-housing issues and prohibited wording.
+
+The user message is a JSON object describing one property.
+Return ONLY valid JSON with these keys:
+- "mls_description": string (between the input's "mls_min_chars" and "mls_max_chars" characters, no emojis)
+- "social_caption": string (1–2 sentences, approachable, no hashtags)
+- "instagram_hashtags": array of 10–18 hashtag strings (max 20), each a single token starting with "#"
+- "video_script_60s": array of 6 scene objects {"t": "0-10s", "line": "..."} covering 45–60 seconds; short lines, easy to read aloud
+
+Rules:
+- MLS description MUST be between "mls_min_chars" and "mls_max_chars" characters.
+- Before finalizing, count the characters of "mls_description" and rewrite it yourself until it is inside that window — do not return an out-of-range draft.
+- Follow the input's "detail_guidance" instruction for target length within the window.
+- The first sentence must be a strong hook that highlights the single most impressive or unique feature in under 12 words.
+- Do NOT start with “Welcome to”, “Introducing”, “Step inside”, or similar generic openings.
+- Do NOT start with the property’s address or location.
+- Begin with vivid and factual details that spark curiosity or emotion.
+- Examples of strong hooks:
+    - “Panoramic ocean views frame every room in this coastal masterpiece.”
+    - “A private backyard oasis awaits with a resort-style pool and spa.”
+    - “Vaulted ceilings and skylights flood the open-concept living area with light.”
+- Examples of weak hooks to avoid:
+    - “Welcome to this beautiful home…”
+    - “Introducing our latest listing…”
+    - “Step inside and discover…”
+- Weave in the input's "keywords"; use "upgrades" and "neighborhood_notes" to reach the target length—be factual.
+- Emphasize the input's "highlight_features" early when present.
+- No exaggerated claims; avoid steering; no terms implying a protected class.
+- Replace subjective school/safety claims with neutral proximity phrasing (“near local schools,” “close to parks”).
+- Plain language; avoid fluff/clichés; vary sentence length.
+- For the video script: opening hook, 3–5 key features, 1 lifestyle/neighborhood beat, soft CTA (“Schedule a tour to see it in person.”). No phone numbers.
+
+The input's "upgrades" field may reference features by ID. Legend:
+""".strip() + "\n" + FEATURE_LEGEND
+
+def _primary_context(li: ListingInput) -> Dict[str, Any]:
+    return {
+        "address": li.address,
+        "city": li.city,
+        "state": li.state,
+        "zip": li.zip_code,
+        "property_type": li.property_type,
+        "beds": li.beds,
+        "baths": li.baths,
+        "sqft": li.sqft,
+        "lot_size": li.lot_size,
+        "year_built": li.year_built,
+        "price": li.price,
+        "keywords": list(li.keywords),
+        "upgrades": li.upgrades_ids or li.upgrades_bullets,
+        "neighborhood_notes": li.neighborhood_notes,
+        "highlight_features": list(li.highlight_features[:6]),
+        "target_buyer_profile": li.target_buyer_profile,
+        "tone": li.tone,
+        "mls_min_chars": int(li.mls_char_limit * 0.9),
+        "mls_max_chars": li.mls_char_limit,
+        "detail_guidance": detail_level_guidance(li.detail_level),
+    }
+
+def build_static_prefix() -> str:
+    """Static system prefix: rules, hook examples, and the feature-ID legend.
+
+    Byte-identical across requests and comfortably over 1024 tokens, so
+    OpenAI's automatic prompt caching reuses the processed prefix — the only
+    uncached content per request is the small dynamic suffix below.
+    """
+    return PRIMARY_SYSTEM_PROMPT
+
+# lru_cache works here because ListingInput is frozen/hashable; regenerations
+# with the same inputs reuse the rendered string (it's built twice per run —
+# once for the semantic-cache embedding, once for the actual call).
+@functools.lru_cache(maxsize=128)
+def build_dynamic_suffix(li: ListingInput) -> str:
+    # Compact JSON context: fewer prompt tokens than the old prose template,
+    # and the only part of the prompt that varies per listing.
+    return json.dumps(_primary_context(li), ensure_ascii=False)
+
+def safe_json_extract(text: str) -> Dict[str, Any]:
+    # With JSON mode on the API call this fallback almost never fires,
+    # but keep it as defensive parsing.
+    text = text or ""
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        start = text.find("{")
+        end = text.rfind("}")
+        if start != -1 and end != -1 and end > start:
+            return json.loads(text[start:end+1])
+        raise
+
+# ---------- Disk-backed LLM cache ----------
+# st.cache_data is per-process and dies on redeploys; identical low-temperature
+# prompts (same taxonomy -> same keyword strings) are worth keeping across
+# sessions. Keyed on model + prompts + temperature, week-long TTL.
+_LLM_CACHE_PATH = ".llm_cache.sqlite3"
+_LLM_CACHE_TTL = 7 * 24 * 3600
+_LLM_CACHE_MAX_TEMPERATURE = 0.2
+
+@st.cache_resource
+def _llm_cache_conn() -> sqlite3.Connection:
+    conn = sqlite3.connect(_LLM_CACHE_PATH, check_same_thread=False)
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS llm_cache (key TEXT PRIMARY KEY, value TEXT, ts INTEGER)"
+    )
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS result_cache (key TEXT PRIMARY KEY, data TEXT, ts INTEGER)"
+    )
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS semantic_cache ("
+        "id INTEGER PRIMARY KEY AUTOINCREMENT, vec TEXT, mls_char_limit INTEGER, "
+        "data TEXT, ts INTEGER)"
+    )
+    conn.commit()
+    return conn
+
+def _llm_cache_key(system_prompt: str, user_prompt: str, temperature: float) -> str:
+    payload = json.dumps(
+        [MODEL_NAME, system_prompt, user_prompt, temperature], sort_keys=True
+    ).encode("utf-8")
+    return hashlib.sha256(payload).hexdigest()
+
+def _llm_cache_get(key: str) -> Optional[str]:
+    row = _llm_cache_conn().execute(
+        "SELECT value, ts FROM llm_cache WHERE key = ?", (key,)
+    ).fetchone()
+    if row and time.time() - row[1] < _LLM_CACHE_TTL:
+        return row[0]
+    return None
+
+def _llm_cache_put(key: str, value: str) -> None:
+    conn = _llm_cache_conn()
+    conn.execute(
+        "INSERT OR REPLACE INTO llm_cache (key, value, ts) VALUES (?, ?, ?)",
+        (key, value, int(time.time())),
+    )
+    conn.commit()
+
+# Post-repair results keyed by the full ListingInput: a regenerate with
+# identical inputs is a ~1 ms lookup instead of a fresh network call, and the
+# repair/length passes are skipped too since the stored dict is already final.
+def _listing_result_key(li: "ListingInput", model: str, temperature: float) -> str:
+    payload = (
+        json.dumps(asdict(li), sort_keys=True).encode("utf-8")
+        + model.encode("utf-8")
+        + str(temperature).encode("utf-8")
+    )
+    return hashlib.blake2b(payload).hexdigest()
+
+def _result_cache_get(key: str) -> Optional[Dict[str, Any]]:
+    row = _llm_cache_conn().execute(
+        "SELECT data, ts FROM result_cache WHERE key = ?", (key,)
+    ).fetchone()
+    if row and time.time() - row[1] < _LLM_CACHE_TTL:
+        return json.loads(row[0])
+    return None
+
+def _result_cache_put(key: str, data: Dict[str, Any]) -> None:
+    conn = _llm_cache_conn()
+    conn.execute(
+        "INSERT OR REPLACE INTO result_cache (key, data, ts) VALUES (?, ?, ?)",
+        (key, json.dumps(data, ensure_ascii=False), int(time.time())),
+    )
+    conn.commit()
+
+# Semantic cache: listings often differ only slightly between runs (tweaked
+# beds/baths or tone), and each tweak used to trigger a fresh LLM call. Embed
+# the canonical prompt with OpenAI's small embedding model (already-available
+# client, no sentence-transformers/FAISS dependency) and reuse a stored result
+# when cosine similarity clears the threshold. Embeddings come back
+# unit-normalized, so the dot product is the cosine similarity.
+_SEMANTIC_SIM_THRESHOLD = 0.95
+_SEMANTIC_CACHE_MAX_ROWS = 256  # same bound the builder caches use (max_entries)
+_EMBEDDING_MODEL = "text-embedding-3-small"
+
+def _embed_prompt(text: str) -> List[float]:
+    resp = client.embeddings.create(model=_EMBEDDING_MODEL, input=text)
+    return resp.data[0].embedding
+
+def _semantic_cache_lookup(vec: List[float], mls_char_limit: int) -> Optional[Dict[str, Any]]:
+    best_score, best_data = 0.0, None
+    # Only rows generated under the SAME character limit are reusable: a
+    # result written for a larger limit can exceed the requested cap, and
+    # hits skip ensure_length entirely. The value here is near-duplicates in
+    # the other fields (beds/baths/tone tweaks). Filtering limit and TTL in
+    # SQL keeps the Python dot-product loop (json.loads of a ~1536-float
+    # vector per row) to live candidates only.
+    for row_vec, row_data in _llm_cache_conn().execute(
+        "SELECT vec, data FROM semantic_cache WHERE mls_char_limit = ? AND ts >= ?",
+        (mls_char_limit, int(time.time()) - _LLM_CACHE_TTL),
+    ):
+        score = sum(a * b for a, b in zip(vec, json.loads(row_vec)))
+        if score > best_score:
+            best_score, best_data = score, row_data
+    if best_score > _SEMANTIC_SIM_THRESHOLD and best_data is not None:
+        return json.loads(best_data)
+    return None
+
+def _semantic_cache_put(vec: List[float], mls_char_limit: int, data: Dict[str, Any]) -> None:
+    conn = _llm_cache_conn()
+    now = int(time.time())
+    # Evict on write so the table (and the per-submit scan) stays bounded:
+    # expired rows go first, then anything beyond the newest N.
+    conn.execute("DELETE FROM semantic_cache WHERE ts < ?", (now - _LLM_CACHE_TTL,))
+    conn.execute(
+        "INSERT INTO semantic_cache (vec, mls_char_limit, data, ts) VALUES (?, ?, ?, ?)",
+        (json.dumps(vec), mls_char_limit, json.dumps(data, ensure_ascii=False), now),
+    )
+    conn.execute(
+        "DELETE FROM semantic_cache WHERE rowid NOT IN ("
+        "SELECT rowid FROM semantic_cache ORDER BY ts DESC, rowid DESC LIMIT ?)",
+        (_SEMANTIC_CACHE_MAX_ROWS,),
+    )
+    conn.commit()
+
+def _chat_kwargs(system_prompt: str, user_prompt: str, temperature: float,
+                 json_mode: bool, model: Optional[str] = None,
+                 max_tokens: Optional[int] = None) -> Dict[str, Any]:
+    kwargs: Dict[str, Any] = dict(
+        model=model or MODEL_NAME,
+        messages=[{"role": "system", "content": system_prompt},
+                  {"role": "user", "content": user_prompt}],
+        temperature=temperature,
+    )
+    if max_tokens is not None:
+        # Decode cost is linear in output tokens; stop the model near the
+        # target instead of trimming a long overrun afterwards.
+        kwargs["max_tokens"] = max_tokens
+    if json_mode:
+        # JSON mode guarantees syntactically valid JSON from the model,
+        # so safe_json_extract's salvage path stays cold.
+        kwargs["response_format"] = {"type": "json_object"}
+    return kwargs
+
+@st.cache_data(show_spinner=False, ttl=3600)
+def _cached_chat_raw(system_prompt: str, user_prompt: str, temperature: float,
+                     json_mode: bool, nonce: Optional[str],
+                     max_tokens: Optional[int]) -> str:
+    # nonce participates in the cache key only — bump it to force a fresh call
+    resp = client.chat.completions.create(
+        **_chat_kwargs(system_prompt, user_prompt, temperature, json_mode,
+                       max_tokens=max_tokens)
+    )
+    return resp.choices[0].message.content or ""
+
+def chat_raw(system_prompt: str, user_prompt: str, temperature: float,
+             json_mode: bool = False, nonce: Optional[str] = None,
+             max_tokens: Optional[int] = None) -> str:
+    # Near-deterministic calls hit the disk cache (survives restarts), then
+    # the in-process st.cache_data layer; sampled calls go straight to the API.
+    cacheable = temperature <= _LLM_CACHE_MAX_TEMPERATURE and nonce is None
+    if cacheable:
+        key = _llm_cache_key(system_prompt, user_prompt, temperature)
+        hit = _llm_cache_get(key)
+        if hit is not None:
+            return hit
+    if temperature <= 0.1:
+        out = _cached_chat_raw(system_prompt, user_prompt, temperature, json_mode,
+                               nonce, max_tokens)
+    else:
+        resp = client.chat.completions.create(
+            **_chat_kwargs(system_prompt, user_prompt, temperature, json_mode,
+                           max_tokens=max_tokens)
+        )
+        out = resp.choices[0].message.content or ""
+    if cacheable and out:
+        # Never persist truncated/unparseable JSON: a bad entry would be
+        # replayed for the full TTL before any caller gets to validate it.
+        if json_mode:
+            try:
+                json.loads(out)
+            except ValueError:
+                return out
+        _llm_cache_put(key, out)
+    return out
+
+def chat_json(system_prompt: str, user_prompt: str, temperature: float,
+              nonce: Optional[str] = None, max_tokens: Optional[int] = None):
+    raw = chat_raw(system_prompt, user_prompt, temperature, json_mode=True,
+                   nonce=nonce, max_tokens=max_tokens)
+    return safe_json_extract(raw), raw
+
+def chat_stream(system_prompt: str, user_prompt: str, temperature: float,
+                json_mode: bool = False, model: Optional[str] = None,
+                max_tokens: Optional[int] = None):
+    """Yield content deltas as they arrive so the UI can render progressively."""
+    resp = client.chat.completions.create(
+        stream=True,
+        **_chat_kwargs(system_prompt, user_prompt, temperature, json_mode, model=model,
+                       max_tokens=max_tokens)
+    )
+    for chunk in resp:
+        delta = chunk.choices[0].delta.content or ""
+        if delta:
+            yield delta
+
+_MLS_KEY_RE = re.compile(r'"mls_description"\s*:\s*"')
+
+def _decode_json_string_step(s: str) -> Tuple[str, str, bool]:
+    """Decode as much of an escaped JSON string fragment as possible.
+
+    Returns (decoded_text, undecoded_remainder, value_closed). Escapes split
+    across deltas stay in the remainder until the next chunk completes them.
+    """
+    out: List[str] = []
+    i, n = 0, len(s)
+    while i < n:
+        c = s[i]
+        if c == '"':
+            return "".join(out), s[i + 1:], True
+        if c == "\\":
+            if i + 1 >= n:
+                break
+            e = s[i + 1]
+            if e == "u":
+                if i + 6 > n:
+                    break
+                out.append(chr(int(s[i + 2:i + 6], 16)))
+                i += 6
+                continue
+            out.append({"n": "\n", "t": "\t", "r": "\r"}.get(e, e))
+            i += 2
+            continue
+        out.append(c)
+        i += 1
+    return "".join(out), s[i:], False
+
+def stream_mls_description(deltas, raw_parts: List[str]):
+    """Yield the streamed "mls_description" value for progressive display.
+
+    Every delta is also appended to raw_parts, so the caller can parse the
+    complete JSON once the stream is exhausted — the displayed text is a
+    best-effort preview, the parsed buffer stays authoritative.
+    """
+    buf = ""
+    state = "seeking"
+    for delta in deltas:
+        raw_parts.append(delta)
+        if state == "done":
+            continue
+        buf += delta
+        if state == "seeking":
+            m = _MLS_KEY_RE.search(buf)
+            if not m:
+                continue
+            buf = buf[m.end():]
+            state = "value"
+        if state == "value":
+            text, buf, closed = _decode_json_string_step(buf)
+            if text:
+                yield text
+            if closed:
+                state = "done"
+
+async def achat_raw(system_prompt: str, user_prompt: str, temperature: float,
+                    json_mode: bool = False, max_retries: int = 3,
+                    max_tokens: Optional[int] = None) -> str:
+    # Exponential backoff on 429s so parallel bursts don't trip rate limits
+    for attempt in range(max_retries + 1):
+        try:
+            resp = await aclient.chat.completions.create(
+                **_chat_kwargs(system_prompt, user_prompt, temperature, json_mode,
+                               max_tokens=max_tokens)
+            )
+            return resp.choices[0].message.content or ""
+        except RateLimitError:
+            if attempt == max_retries:
+                raise
+            await asyncio.sleep(2 ** attempt)
+    return ""
+
+async def achat_json(system_prompt: str, user_prompt: str, temperature: float,
+                     max_tokens: Optional[int] = None):
+    raw = await achat_raw(system_prompt, user_prompt, temperature, json_mode=True,
+                          max_tokens=max_tokens)
+    return safe_json_extract(raw), raw
+
+def merge_preserving(original: Dict[str, Any], updates: Dict[str, Any]) -> Dict[str, Any]:
+    out = dict(original or {})
+    for k, v in (updates or {}).items():
+        out[k] = v
+    return out
+
+def _shared_repair_context(li: ListingInput) -> str:
+    return f"""
+Address: {li.address}, {li.city}, {li.state} {li.zip_code}
+Type: {li.property_type}
+Beds/Baths: {li.beds} bd / {li.baths} ba | Sq Ft: {li.sqft} | Lot: {li.lot_size} | Year: {li.year_built} | Price: {li.price}
+Keywords: {", ".join(li.keywords)}
+Upgrades (bulleted):
+{li.upgrades_bullets}
+Neighborhood: {li.neighborhood_notes}
+Highlight features: {", ".join(li.highlight_features)}
+Tone: {li.tone}
+"""
+
+def _repair_prompt(li: ListingInput, key: str) -> Optional[str]:
+    shared_ctx = _shared_repair_context(li)
+    min_chars = int(li.mls_char_limit * 0.9)
+
+    if key == "social_caption":
+        return f"""
+Using this property context:
+{shared_ctx}
+
+Write ONLY JSON with:
+{{"social_caption": "<1–2 sentence caption (no hashtags) in a friendly {li.tone.lower()} tone>"}}
+"""
+    if key == "instagram_hashtags":
+        return f"""
+Using this property context:
+{shared_ctx}
+
+Write ONLY JSON with:
+{{"instagram_hashtags": ["#tag1", "#tag2", ...]}}
+10–18 hashtags (max 20), each a single token starting with '#'.
+Prefer local + lifestyle + property-type tags. No emojis.
+"""
+    if key == "video_script_60s":
+        return f"""
+Using this property context:
+{shared_ctx}
+
+Write ONLY JSON with:
+{{"video_script_60s": [{{"t": "0-10s", "line": "..."}}, ...]}}
+6 scenes covering 45–60 seconds: hook, 3–5 key features, 1 lifestyle/neighborhood beat, soft CTA. No phone numbers.
+Use short lines that read well on camera.
+"""
+    if key == "mls_description":
+        return f"""
+Using this property context:
+{shared_ctx}
+
+Write ONLY JSON with:
+{{"mls_description": "<MLS description between {min_chars} and {li.mls_char_limit} characters, no emojis>"}}
+Be compliant. Replace subjective school/safety claims with neutral proximity phrasing.
+"""
+    return None
+
+def _run_repair_batch(system: str, prompts: Dict[str, str], temperature: float,
+                      poll_interval: float = 10.0) -> Dict[str, Dict[str, Any]]:
+    """Submit all repair prompts as one Batch API job and wait for results.
+
+    Returns {key: parsed_json} for every request that completed. Meant for
+    non-interactive bulk runs — the Batch API is ~50% cheaper and has its own
+    rate limits, but the completion window is up to 24h.
+    """
+    lines = []
+    for key, prompt in prompts.items():
+        lines.append(json.dumps({
+            "custom_id": key,
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": {
+                "model": MODEL_NAME,
+                "messages": [{"role": "system", "content": system},
+                             {"role": "user", "content": prompt}],
+                "temperature": temperature,
+                "response_format": {"type": "json_object"},
+            },
+        }))
+    batch_file = client.files.create(
+        file=io.BytesIO("\n".join(lines).encode("utf-8")),
+        purpose="batch",
+    )
+    batch = client.batches.create(
+        input_file_id=batch_file.id,
+        endpoint="/v1/chat/completions",
+        completion_window="24h",
+    )
+    while batch.status not in ("completed", "failed", "expired", "cancelled"):
+        time.sleep(poll_interval)
+        batch = client.batches.retrieve(batch.id)
+
+    results: Dict[str, Dict[str, Any]] = {}
+    if batch.status == "completed" and batch.output_file_id:
+        output = client.files.content(batch.output_file_id).text
+        for line in output.splitlines():
+            if not line.strip():
+                continue
+            row = json.loads(line)
+            resp = row.get("response") or {}
+            if resp.get("status_code") != 200:
+                continue
+            content = resp["body"]["choices"][0]["message"]["content"] or ""
+            try:
+                results[row["custom_id"]] = safe_json_extract(content)
+            except (json.JSONDecodeError, ValueError):
+                continue
+    return results
+
+def _field_present(value: Any) -> bool:
+    # Hashtags and the video script are arrays now; the other fields are strings.
+    if isinstance(value, str):
+        return bool(value.strip())
+    if isinstance(value, list):
+        return bool(value)
+    return False
+
+def _result_complete(data: Dict[str, Any]) -> bool:
+    return all(_field_present(data.get(k)) for k in REQUIRED_KEYS)
+
+def validate_and_repair(li: ListingInput, data: Dict[str, Any]) -> Dict[str, Any]:
+    system = COPYWRITER_SYSTEM_PROMPT
+
+    missing = [k for k in REQUIRED_KEYS if not _field_present(data.get(k))]
+    if not missing:
+        return data
+
+    prompts = {key: prompt for key in missing if (prompt := _repair_prompt(li, key))}
+
+    if li.batch_mode:
+        # temperature=0: repairs are deterministic fill-ins, and zero
+        # temperature makes them cacheable across runs.
+        results = _run_repair_batch(system, prompts, temperature=0)
+        for key in missing:
+            if key in results:
+                data = merge_preserving(data, results[key])
+        return data
+
+    # Interactive path: fire all repairs concurrently instead of paying
+    # one round-trip per missing key.
+    keys = [k for k in missing if k in prompts]
+
+    async def _gather():
+        return await asyncio.gather(
+            *(achat_json(system, prompts[k], temperature=0) for k in keys),
+            return_exceptions=True,
+        )
+
+    for key, result in zip(keys, asyncio.run(_gather())):
+        if isinstance(result, Exception):
+            continue
+        partial, _ = result
+        data = merge_preserving(data, partial)
+
+    return data
+
+def ensure_length(li: ListingInput, data: Dict[str, Any], tolerance: float = 0.05) -> Dict[str, Any]:
+    min_chars = int(li.mls_char_limit * 0.9)
+    max_chars = li.mls_char_limit
+    current = (data.get("mls_description") or "").strip()
+
+    # The primary prompt now carries the length contract, so slight
+    # undershoot is accepted rather than paying a second round-trip for a
+    # handful of characters. Over-length is a hard MLS limit — no grace.
+    soft_min = int(min_chars * (1 - tolerance))
+    if soft_min <= len(current) <= max_chars:
+        return data
+
+    system = COPYWRITER_SYSTEM_PROMPT
+    prompt = f"""
+Revise the following MLS description to be between {min_chars} and {max_chars} characters.
+Keep meaning and compliance. Add concrete, factual property details where helpful.
+Return ONLY JSON with this single key:
+{{"mls_description": "…"}}
+
+Current (length {len(current)}):
+<<<{current}>>>
+""".strip()
+
+    revision_json, _ = chat_json(system, prompt, temperature=0,
+                                 max_tokens=_mls_max_tokens(max_chars))
+    revised_desc = (revision_json.get("mls_description") or "").strip()
+    if revised_desc:
+        data["mls_description"] = revised_desc
+    return data
+
+# The four outputs are independent, so the interactive path fans out: the MLS
+# description streams in the foreground while the three short fields are
+# generated concurrently via the async client. Wall time is roughly
+# max(per-call latency) instead of the sum, and the three aux calls skip JSON
+# framing of one long combined object.
+AUX_FIELD_KEYS = ("social_caption", "instagram_hashtags", "video_script_60s")
+
+# Per-field decode budgets (tokens), sized to the expected output plus JSON
+# framing, so the model stops near the target instead of rambling.
+AUX_FIELD_MAX_TOKENS = {
+    "social_caption": 120,
+    # Compound tags run ~5 BPE tokens each plus quotes/comma in the JSON
+    # array, so 18 tags need well over the old 80-token cap.
+    "instagram_hashtags": 180,
+    # 6 scene objects: ~12 tokens of {"t": ..., "line": ...} framing each
+    # on top of the spoken lines.
+    "video_script_60s": 480,
+}
+
+def _mls_max_tokens(mls_char_limit: int) -> int:
+    # ~3.5 chars/token for English prose, plus headroom for the JSON wrapper
+    return math.ceil(mls_char_limit / 3.5) + 60
+
+_MLS_ONLY_NOTE = (
+    '\n\nFor this request, return ONLY JSON {"mls_description": "..."} — '
+    "the other outputs are generated separately."
+)
+
+def generate_aux_fields(li: ListingInput) -> Dict[str, Any]:
+    """Generate caption, hashtags, and video script concurrently.
+
+    Reuses the per-key repair prompts; failures are left out so
+    validate_and_repair can retry them individually.
+    """
+    async def _go():
+        return await asyncio.gather(
+            *(achat_json(COPYWRITER_SYSTEM_PROMPT, _repair_prompt(li, k), temperature=0,
+                         max_tokens=AUX_FIELD_MAX_TOKENS[k])
+              for k in AUX_FIELD_KEYS),
+            return_exceptions=True,
+        )
+
+    out: Dict[str, Any] = {}
+    for key, result in zip(AUX_FIELD_KEYS, asyncio.run(_go())):
+        if isinstance(result, Exception):
+            continue
+        partial, _ = result
+        out = merge_preserving(out, partial)
+    return out
+
+# Per-field post-processing for the interactive path. Only the MLS text has a
+# real dependency chain (repair -> length fix, possibly another LLM call); the
+# aux fields just need a trim or an independent repair. Running them as
+# separate futures hides any MLS follow-up call behind the aux cleanup.
+def _finalize_mls(li: ListingInput, data: Dict[str, Any]) -> Dict[str, Any]:
+    current = data.get("mls_description")
+    if not (isinstance(current, str) and current.strip()):
+        partial, _ = chat_json(COPYWRITER_SYSTEM_PROMPT, _repair_prompt(li, "mls_description"),
+                               temperature=0, max_tokens=_mls_max_tokens(li.mls_char_limit))
+        data = merge_preserving(data, partial)
+    return ensure_length(li, data)
+
+def _finalize_aux(li: ListingInput, key: str) -> Dict[str, Any]:
+    partial, _ = chat_json(COPYWRITER_SYSTEM_PROMPT, _repair_prompt(li, key),
+                           temperature=0, max_tokens=AUX_FIELD_MAX_TOKENS[key])
+    return partial
+
+def finalize_fields(li: ListingInput, data: Dict[str, Any]) -> Dict[str, Any]:
+    """Repair and length-fix all fields concurrently."""
+    with ThreadPoolExecutor(max_workers=4) as ex:
+        mls_future = ex.submit(_finalize_mls, li, dict(data))
+        aux_futures = {
+            key: ex.submit(_finalize_aux, li, key)
+            for key in AUX_FIELD_KEYS
+            if not _field_present(data.get(key))
+        }
+        data = mls_future.result()
+        for key, future in aux_futures.items():
+            try:
+                data = merge_preserving(data, future.result())
+            except Exception:
+                continue  # leave the field missing; the UI shows a placeholder
+    return data
+
+def generate_batch(lis: List[ListingInput]) -> List[Dict[str, Any]]:
+    """Generate copy for several listings with one chat call.
+
+    Sends all property contexts in a single request and asks for a
+    JSON array back — one RPM slot and one system-prompt prefill for N
+    listings. Malformed or missing entries fall back to the per-field
+    repair path individually.
+    """
+    system = build_static_prefix() + (
+        "\n\nBatch mode: the user message is {\"properties\": [...]} with one object per "
+        "property. Return ONLY JSON {\"results\": [...]} with one output object per "
+        "property, in the same order."
+    )
+    user = json.dumps(
+        {"properties": [_primary_context(li) for li in lis]}, ensure_ascii=False
+    )
+    data, _ = chat_json(system, user, temperature=0.5)
+    results = data.get("results") or []
+
+    out: List[Dict[str, Any]] = []
+    for i, li in enumerate(lis):
+        item = results[i] if i < len(results) and isinstance(results[i], dict) else {}
+        item = validate_and_repair(li, item)
+        item = ensure_length(li, item)
+        out.append(item)
+    return out
+
+# ---------- UI ----------
+st.title("🏠 AI Listing Writer")
+st.caption("Check the features, and we’ll generate an MLS-ready description, a social caption, hashtags, and a 60-second video script.")
+
+with st.sidebar:
+    st.markdown("### Settings")
+    detail_level = st.selectbox("Detail Level", ["Concise", "Standard", "Descriptive"], index=2)
+    mls_char_limit = st.slider("MLS Character Limit", min_value=500, max_value=1800, value=1800, step=50)
+    st.toggle("Force premium model", key="force_premium_model",
+              help="Always use the top model tier regardless of detail level.")
+    st.toggle("Force regenerate", key="force_regenerate",
+              help="Skip all caches and generate fresh copy on the next run.")
+
+# Precompute taxonomy/groups so they're available outside the form as well
+tax = feature_taxonomy()
+groups = list(tax.keys())
+
+# -------- Property Basics (COMPACT) --------
+# Fragment: widget events inside only rerun this function, not the whole
+# script. Values land in session_state via widget keys; the generate block
+# reads them from there. (st.fragment is still experimental on 1.36.)
+@st.experimental_fragment
+def render_property_basics():
+    st.subheader("Property Basics")
+
+    # Full-width street address (usually needs space)
+    st.text_input("Street Address*", placeholder="123 Main St", key="address")
+
+    # City / State / ZIP on one row
+    c1, c2, c3 = st.columns([2, 0.7, 1])
+    with c1:
+        st.text_input("City*", placeholder="San Diego", key="city")
+    with c2:
+        st.text_input("State*", value="CA", key="state")
+    with c3:
+        st.text_input("ZIP*", placeholder="92101", key="zip_code")
+
+    # Beds / Baths / Sq Ft / Lot Size on one row
+    r1c1, r1c2, r1c3, r1c4 = st.columns([1, 1, 1, 1])
+    with r1c1:
+        st.number_input("Bedrooms", min_value=0.0, step=0.5, value=3.0, key="beds")
+    with r1c2:
+        st.number_input("Bathrooms", min_value=0.0, step=0.5, value=2.0, key="baths")
+    with r1c3:
+        st.number_input("Interior Sq Ft", min_value=0, step=50, value=1600, key="sqft")
+    with r1c4:
+        st.number_input("Lot Size (sq ft)", min_value=0, step=100, value=5000, key="lot_size")
+
+    # Year Built / List Price / Property Type / Tone on one row
+    r2c1, r2c2, r2c3, r2c4 = st.columns([1, 1.2, 1.3, 1.3])
+    with r2c1:
+        st.number_input("Year Built", min_value=1800, max_value=2100, value=1995, key="year_built")
+    with r2c2:
+        st.number_input("List Price", min_value=0, step=5000, value=799000, key="price")
+    with r2c3:
+        st.selectbox(
+            "Property Type",
+            ["Single Family", "Condo", "Townhome", "Multi-Unit", "Luxury", "Investment"],
+            key="property_type"
+        )
+    with r2c4:
+        st.selectbox(
+            "Tone (How do you want your description to feel)",
+            ["Professional", "Warm & Inviting", "Luxury", "Investor-Focused", "Coastal Vibes"],
+            key="tone"
+        )
+
+    # Target Buyer Profile / Neighborhood Notes (two-up, with notes wider)
+    r3c1, r3c2 = st.columns([1.2, 2])
+    with r3c1:
+        st.text_input(
+            "Target Buyer Profile",
+            "Move-up buyers who value indoor-outdoor living",
+            key="target_buyer_profile"
+        )
+    with r3c2:
+        st.text_area(
+            "Neighborhood Notes (proximity phrasing only)",
+            "Near parks and local schools; quick access to I-15; minutes to shops and cafes.",
+            height=80,
+            key="neighborhood_notes"
+        )
+
+render_property_basics()
+
+st.markdown("---")
+
+
+# -------- Features (BELOW property basics) --------
+def _group_key(idx: int) -> str:
+    return f"sel_group_{idx}"
+
+@st.experimental_fragment
+def render_features_form():
+    st.subheader("Features (check all that apply)")
+    with st.form("features_form", clear_on_submit=False):
+        feat_cols = st.columns(2)
+
+        # Collect within this form run (commit on Apply)
+        new_selected_by_key: Dict[str, List[str]] = {}
+
+        for i, group in enumerate(groups):
+            all_labels = GROUP_LABELS[group]
+            label_set = GROUP_LABEL_SETS[group]
+            key = _group_key(i)
+            current_selected = st.session_state.get(key, [])
+
+            with feat_cols[i % 2]:
+                with st.expander(group, expanded=False):
+                    new_visible = st.multiselect(
+                        label=f"{group} features",
+                        options=all_labels,
+                        default=[x for x in current_selected if x in label_set],
+                        key=f"ui_{key}",
+                        label_visibility="collapsed",
+                        placeholder="Select one or more features"
+                    )
+                    new_selected_by_key[key] = new_visible
+
+        # Form button
+        applied = st.form_submit_button("Apply feature selections")
+
+        if applied:
+            # Commit the selections
+            for key, new_list in new_selected_by_key.items():
+                st.session_state[key] = new_list
+            st.toast("Applied!", icon="✅")
+
+render_features_form()
+
+# Assemble selection dict from session_state; cached so reruns triggered by
+# unrelated widgets reuse the same dict until selections actually change.
+@st.cache_data(show_spinner=False)
+def assemble_selections(state_tuple: Tuple[Tuple[str, ...], ...]) -> Dict[str, List[str]]:
+    return {group: list(labels) for group, labels in zip(groups, state_tuple)}
+
+_sel_state = tuple(
+    tuple(st.session_state.get(f"sel_group_{i}", ())) for i in range(len(groups))
+)
+selections: Dict[str, List[str]] = assemble_selections(_sel_state)
+
+# ---- Optional extra keywords (BEFORE generation) ----
+st.session_state.setdefault("extra_keywords_raw", "")
+extra_kw_raw = st.text_input("Additional Keywords and Features", key="extra_keywords_raw")
+
+# robust split on commas / semicolons / new lines — translate + split is one
+# C-level pass, and lowercasing here drops the second pass before extend
+# Split, normalize and dedup in one pass; fed straight into the keyword builder
+extra_keywords = list(dict.fromkeys(
+    s for s in (t.strip().casefold() for t in extra_kw_raw.translate(_KW_TRANS).split("\x1f")) if s
+))
+
+st.markdown("---")
+submitted = st.button("Start Generating")
+
+# ---------- Generate ----------
+if submitted:
+    # Property-basics widgets live in a fragment; pull their values
+    # out of session_state via their widget keys.
+    ss = st.session_state
+    address = ss.get("address", "")
+    city = ss.get("city", "")
+    state = ss.get("state", "")
+    zip_code = ss.get("zip_code", "")
+    beds = ss.get("beds")
+    baths = ss.get("baths")
+    sqft = ss.get("sqft")
+    lot_size = ss.get("lot_size")
+    year_built = ss.get("year_built")
+    price = ss.get("price")
+    property_type = ss.get("property_type", "Single Family")
+    tone = ss.get("tone", "Professional")
+    target_buyer_profile = ss.get("target_buyer_profile", "")
+    neighborhood_notes = ss.get("neighborhood_notes", "")
+
+    # Fail fast before anything expensive runs
+    if not address or not city or not state or not zip_code:
+        st.error("Please fill in the address, city, state, and ZIP.")
+        st.stop()
+    if not _STATE_RE.match(state.strip().upper()):
+        st.error("State must be a two-letter code (e.g. CA).")
+        st.stop()
+    if not _ZIP_RE.match(zip_code.strip()):
+        st.error("ZIP must be 5 digits (optionally ZIP+4, e.g. 92101 or 92101-1234).")
+        st.stop()
+
+    # Coerce the numeric widget values once and reuse everywhere below
+    nums = {k: _opt_int(v) for k, v in (
+        ("sqft", sqft), ("lot_size", lot_size), ("year_built", year_built), ("price", price)
+    )}
+
+    auto_keywords = build_keywords_from_selections(
+        selected=selections,
+        beds=beds,
+        baths=baths,
+        sqft=nums["sqft"],
+        lot_size=nums["lot_size"],
+        year_built=nums["year_built"],
+        property_type=property_type,
+        extra_keywords=extra_keywords,
+    )
+    # Builder output is already normalized and deduped; cap at 40 — more
+    # keywords don't improve SEO prompting.
+    auto_keywords = auto_keywords[:40]
+
+    upgrades_bullets = build_upgrades_bullets(selections, custom_lines=[])
+    upgrades_ids = build_upgrades_ids(selections)
+
+    li = ListingInput(
+        address=address, city=city, state=state, zip_code=zip_code,
+        beds=beds, baths=baths, **nums,
+        property_type=property_type,
+        keywords=tuple(auto_keywords),
+        upgrades_bullets=upgrades_bullets, upgrades_ids=upgrades_ids,
+        neighborhood_notes=neighborhood_notes,
+        target_buyer_profile=target_buyer_profile, tone=tone,
+        mls_char_limit=int(mls_char_limit), detail_level=detail_level,
+        highlight_features=()  # wire back if you want a highlight picker
+    )
+
+    primary_temperature = 0.5 if li.detail_level == "Standard" else (0.65 if li.detail_level == "Descriptive" else 0.35)
+    primary_model = select_model(li.detail_level)
+    result_key = _listing_result_key(li, primary_model, primary_temperature)
+    force_regenerate = bool(st.session_state.get("force_regenerate"))
+    data = None
+    if not force_regenerate:
+        # Resubmitting unchanged inputs (e.g. after tweaking an unrelated
+        # widget) reuses the in-memory result from this session outright.
+        memo = st.session_state.get("last_result")
+        if memo is not None and memo[0] == result_key:
+            data = memo[1]
+        if data is None:
+            data = _result_cache_get(result_key)
+
+    # Near-duplicate inputs can reuse a semantically equivalent stored result.
+    # Descriptive runs sample at 0.65 and are too creative to dedupe this way.
+    prompt_vec: Optional[List[float]] = None
+    if data is None and not force_regenerate and li.detail_level != "Descriptive":
+        try:
+            prompt_vec = _embed_prompt(build_dynamic_suffix(li))
+            data = _semantic_cache_lookup(prompt_vec, li.mls_char_limit)
+        except Exception:
+            prompt_vec = None  # embeddings are an optimization, never a blocker
+
+    if data is None:
+        with st.spinner("Generating polished copy..."):
+            try:
+                # Kick off the three short fields in a worker thread, then
+                # stream the MLS description in the foreground — the user
+                # reads the headline output while everything else generates
+                # in parallel. The placeholder is cleared once parsing
+                # succeeds and the formatted sections take over below.
+                with ThreadPoolExecutor(max_workers=1) as ex:
+                    aux_future = ex.submit(generate_aux_fields, li)
+
+                    t0 = time.perf_counter()
+                    raw_parts: List[str] = []
+                    stream_box = st.empty()
+                    with stream_box.container():
+                        st.subheader("MLS Description")
+                        st.write_stream(stream_mls_description(
+                            chat_stream(
+                                build_static_prefix() + _MLS_ONLY_NOTE,
+                                build_dynamic_suffix(li),
+                                temperature=primary_temperature,
+                                json_mode=True,
+                                model=primary_model,
+                                max_tokens=_mls_max_tokens(li.mls_char_limit),
+                            ),
+                            raw_parts,
+                        ))
+                    stream_box.empty()
+                    # Server-side log to sanity-check the tier assignment
+                    print(f"[timing] model={primary_model} detail={li.detail_level} "
+                          f"mls_ttlt={time.perf_counter() - t0:.2f}s")
+                    data = safe_json_extract("".join(raw_parts))
+                    data = merge_preserving(data, aux_future.result())
+                data = finalize_fields(li, data)
+                # finalize_fields leaves a field missing when its repair call
+                # fails; a partial result must stay a cache miss so the next
+                # submit retries instead of replaying it for the full TTL.
+                if _result_complete(data):
+                    _result_cache_put(result_key, data)
+                    if prompt_vec is not None:
+                        _semantic_cache_put(prompt_vec, li.mls_char_limit, data)
+            except Exception as e:
+                st.exception(e)
+                st.stop()
+    if _result_complete(data):
+        st.session_state["last_result"] = (result_key, data)
+
+    # ------------- Outputs -------------
+    st.subheader("MLS Description")
+    mls_text = (data.get("mls_description") or "").strip()
+    st.write(mls_text)
+    st.caption(f"Character count: {len(mls_text)} / {li.mls_char_limit}")
+
+    st.subheader("Social Caption")
+    social_caption = (data.get("social_caption") or "").strip()
+    st.write(social_caption if social_caption else "— (not generated)")
+
+    st.subheader("Instagram Hashtags")
+    hashtags_val = data.get("instagram_hashtags") or []
+    # Accept both the array schema and a legacy space-separated string
+    hashtag_list = hashtags_val.split() if isinstance(hashtags_val, str) else [str(t).strip() for t in hashtags_val]
+    hashtag_list = [tag if tag.startswith('#') else f'#{tag}' for tag in hashtag_list if tag]
+    if hashtag_list:
+        st.text(' '.join(hashtag_list))  # use text() to preserve spacing
+    else:
+        st.write("— (not generated)")
+
+    st.subheader("60-Second Video Script")
+    video_script = data.get("video_script_60s") or ""
+    if isinstance(video_script, list):
+        for scene in video_script:
+            if isinstance(scene, dict):
+                st.markdown(f"**{scene.get('t', '')}** — {scene.get('line', '')}")
+            else:
+                st.write(scene)
+    else:
+        st.write(video_script.strip() if video_script.strip() else "— (not generated)")
+
+    st.success("Done! Review for accuracy/compliance before posting.")
+
+    st.markdown("---")
+    st.subheader("Auto-Generated Inputs (for reference)")
+    st.caption("These are the inputs we fed into the model—edit your selections and regenerate if needed.")
+    st.markdown("**Upgrades/Features (bulleted)**")
+    st.text(upgrades_bullets or "(none)")
+    st.markdown("**SEO Keywords (auto-built)**")
+    st.text(", ".join(auto_keywords) or "(none)")